@@ -0,0 +1,434 @@
+#!/usr/bin/env python
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+"""
+Micro benchmarks for tweepy internals.
+
+Run every benchmark with:  python benchmarks.py
+Or only some of them with: python benchmarks.py cache_codecs ...
+"""
+
+import sys
+import time
+import random
+
+from tweepy import API
+from tweepy.utils import import_simplejson
+
+json = import_simplejson()
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def make_timestamp(rnd):
+    return '%s %s %02d %02d:%02d:%02d +0000 %d' % (
+        rnd.choice(DAYS), rnd.choice(MONTHS), rnd.randint(1, 28),
+        rnd.randint(0, 23), rnd.randint(0, 59), rnd.randint(0, 59),
+        rnd.randint(2007, 2013))
+
+
+def make_user(rnd, user_id):
+    return {
+        'id': user_id, 'id_str': str(user_id),
+        'name': 'User %d' % user_id, 'screen_name': 'user%d' % user_id,
+        'location': 'San Francisco, CA', 'url': 'http://example.com/%d' % user_id,
+        'description': 'Just another account used for benchmarking tweepy.',
+        'protected': False, 'verified': False, 'following': None,
+        'followers_count': rnd.randint(0, 100000),
+        'friends_count': rnd.randint(0, 5000),
+        'listed_count': rnd.randint(0, 500),
+        'favourites_count': rnd.randint(0, 5000),
+        'statuses_count': rnd.randint(0, 50000),
+        'created_at': make_timestamp(rnd),
+        'utc_offset': -28800, 'time_zone': 'Pacific Time (US & Canada)',
+        'geo_enabled': True, 'lang': 'en', 'contributors_enabled': False,
+        'is_translator': False, 'notifications': None,
+        'follow_request_sent': None, 'default_profile': True,
+        'default_profile_image': False,
+        'profile_background_color': 'C0DEED',
+        'profile_background_image_url': 'http://a0.twimg.com/images/themes/theme1/bg.png',
+        'profile_background_tile': False,
+        'profile_image_url': 'http://a0.twimg.com/profile_images/%d/avatar_normal.png' % user_id,
+        'profile_link_color': '0084B4',
+        'profile_sidebar_border_color': 'C0DEED',
+        'profile_sidebar_fill_color': 'DDEEF6',
+        'profile_text_color': '333333',
+        'profile_use_background_image': True,
+        'show_all_inline_media': False,
+    }
+
+
+def make_status(rnd, status_id, user):
+    return {
+        'id': status_id, 'id_str': str(status_id),
+        'created_at': make_timestamp(rnd),
+        'text': 'Benchmark status number %d with a link http://t.co/abc%d #tweepy' % (status_id, status_id),
+        'source': '<a href="http://twitter.com/#!/download/iphone" rel="nofollow">Twitter for iPhone</a>',
+        'truncated': False, 'favorited': False, 'retweeted': False,
+        'retweet_count': rnd.randint(0, 100),
+        'in_reply_to_status_id': None, 'in_reply_to_status_id_str': None,
+        'in_reply_to_user_id': None, 'in_reply_to_user_id_str': None,
+        'in_reply_to_screen_name': None,
+        'geo': None, 'coordinates': None, 'place': None, 'contributors': None,
+        'entities': {
+            'hashtags': [{'text': 'tweepy', 'indices': [60, 67]}],
+            'urls': [{'url': 'http://t.co/abc%d' % status_id,
+                      'expanded_url': 'http://example.com/%d' % status_id,
+                      'display_url': 'example.com/%d' % status_id,
+                      'indices': [40, 59]}],
+            'user_mentions': [],
+        },
+        'user': user,
+    }
+
+
+def make_timeline(count=200, authors=20, seed=0):
+    """Build a decoded home timeline like payload."""
+    rnd = random.Random(seed)
+    users = [make_user(rnd, 1000 + i) for i in range(authors)]
+    return [make_status(rnd, 300000000000000000 + i, rnd.choice(users))
+            for i in range(count)]
+
+
+def measure(func, repeat=5):
+    """Return the best wall clock time of several runs of func."""
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def report(name, seconds, extra=''):
+    print '  %-32s %9.3f ms %s' % (name, seconds * 1000, extra)
+
+
+def bench_cache_codecs():
+    """Size and (de)serialization time of cached timelines."""
+    from tweepy.cache import PickleCodec, CompressedCodec
+    from tweepy.parsers import ModelParser
+
+    api = API()
+    payload = make_timeline()
+    raw = json.dumps(payload)
+    result = ModelParser().model_factory.status.parse_list(api, payload)
+    entry = (time.time(), result)
+
+    print 'cache codecs (200 statuses, raw JSON is %d bytes)' % len(raw)
+    codecs = [
+        ('pickle protocol 0', PickleCodec(0)),
+        ('pickle highest protocol', PickleCodec()),
+        ('zlib + pickle highest', CompressedCodec()),
+    ]
+    for name, codec in codecs:
+        data = codec.encode(entry)
+        encode = measure(lambda: codec.encode(entry))
+        decode = measure(lambda: codec.decode(data))
+        report(name + ' encode', encode, '(%d bytes)' % len(data))
+        report(name + ' decode', decode)
+
+
+def bench_lazy_models():
+    """Eager and lazy parsing of a timeline, reading only a few fields."""
+    from tweepy.parsers import ModelParser
+
+    payload = make_timeline()
+    print 'model parsing (200 statuses, reading id, text and user.id)'
+    for name, parser in [('eager', ModelParser()), ('lazy', ModelParser(lazy=True))]:
+        api = API(parser=parser)
+        model = parser.model_factory.status
+
+        def parse():
+            model.parse_list(api, payload)
+
+        def parse_and_read():
+            for status in model.parse_list(api, payload):
+                status.id, status.text, status.user.id
+
+        report(name + ' parse', measure(parse))
+        report(name + ' parse + read', measure(parse_and_read))
+
+
+def bench_model_memory():
+    """Memory used by each status and user object, values excluded."""
+    from tweepy.models import ModelFactory, CompactModelFactory
+    from tweepy.parsers import ModelParser
+
+    def footprint(obj):
+        size = sys.getsizeof(obj)
+        for attr in ('__dict__', '_extra'):
+            try:
+                size += sys.getsizeof(object.__getattribute__(obj, attr))
+            except AttributeError:
+                pass
+        return size
+
+    payload = make_timeline()
+    print 'model memory per object (values excluded)'
+    for name, factory in [('dict', ModelFactory), ('compact', CompactModelFactory)]:
+        api = API(parser=ModelParser(factory))
+        statuses = factory.status.parse_list(api, payload)
+        print '  %-32s %9d bytes' % (name + ' status', footprint(statuses[0]))
+        print '  %-32s %9d bytes' % (name + ' user', footprint(statuses[0].user))
+        report(name + ' parse 200 statuses',
+               measure(lambda: factory.status.parse_list(api, payload)))
+
+
+def bench_timestamps():
+    """Timestamp parsing against the former setlocale + strptime version."""
+    import locale
+    from datetime import datetime
+    from tweepy.utils import parse_datetime, parse_datetimes, _datetime_cache
+
+    def strptime_parse(string):
+        locale.setlocale(locale.LC_TIME, 'C')
+        date = datetime(*(time.strptime(string, '%a %b %d %H:%M:%S +0000 %Y')[0:6]))
+        locale.setlocale(locale.LC_TIME, '')
+        return date
+
+    rnd = random.Random(0)
+    stamps = [make_timestamp(rnd) for i in range(10000)]
+    # a timeline repeats the creation date of its few authors
+    timeline = []
+    for status in make_timeline():
+        timeline.extend([status['created_at'], status['user']['created_at']])
+
+    def uncached(strings):
+        _datetime_cache.clear()
+        parse_datetimes(strings)
+
+    for name, strings in [('10000 distinct', stamps), ('timeline', timeline)]:
+        print 'timestamp parsing (%s timestamps)' % name
+        baseline = measure(lambda: [strptime_parse(s) for s in strings], 3)
+        report('setlocale + strptime', baseline)
+        for label, func in [('parse_datetimes, cold', uncached),
+                            ('parse_datetimes, memoized', parse_datetimes)]:
+            seconds = measure(lambda: func(strings), 3)
+            report(label, seconds, '(%.1fx)' % (baseline / seconds))
+
+
+def bench_json_backends():
+    """Decoding a timeline with each installed JSON library."""
+    from tweepy.utils import json_backends, get_json_backend
+
+    payload = json.dumps(make_timeline())
+    print 'json decoding (200 statuses, %d bytes)' % len(payload)
+    for name, loader in json_backends:
+        try:
+            backend = get_json_backend(name)
+        except ImportError:
+            print '  %-32s not installed' % name
+            continue
+        report(name, measure(lambda: backend.loads(payload)))
+
+
+def bench_columns():
+    """Column export of ten timeline pages against a Python loop over models."""
+    from array import array
+    from tweepy.columns import ColumnBuilder
+    from tweepy.utils import INT64_TYPECODE
+    from tweepy.models import Status, ResultSet
+
+    api = API()
+    pages = [make_timeline(seed=i) for i in range(10)]
+    fields = ['id', 'created_at', 'retweet_count', 'user.followers_count']
+
+    def python_loop():
+        ids, dates, retweets, followers = [], [], [], []
+        for page in pages:
+            for status in Status.parse_list(api, page):
+                ids.append(status.id)
+                dates.append(time.mktime(status.created_at.timetuple()))
+                retweets.append(status.retweet_count)
+                followers.append(status.user.followers_count)
+        return [array(INT64_TYPECODE, ids), array('d', dates),
+                array(INT64_TYPECODE, retweets), array(INT64_TYPECODE, followers)]
+
+    def from_models():
+        builder = ColumnBuilder(fields, use_numpy=False)
+        for page in pages:
+            builder.add(ResultSet(Status.parse_list(api, page)))
+        return builder.columns()
+
+    def from_json():
+        builder = ColumnBuilder(fields, use_numpy=False)
+        for page in pages:
+            builder.add(page)
+        return builder.columns()
+
+    print 'column export (10 pages of 200 statuses, 4 fields)'
+    baseline = measure(python_loop)
+    report('python loop over models', baseline)
+    for name, func in [('to_columns from models', from_models),
+                       ('ColumnBuilder from raw JSON', from_json)]:
+        seconds = measure(func)
+        report(name, seconds, '(%.1fx)' % (baseline / seconds))
+
+
+def bench_identity_map():
+    """Parsing a timeline with and without interning its 20 authors."""
+    from tweepy.identity import IdentityMap
+    from tweepy.parsers import ModelParser
+
+    payload = make_timeline()
+    print 'identity map (200 statuses, 20 authors)'
+    for name, identity_map in [('without identity map', None),
+                               ('with identity map', IdentityMap())]:
+        api = API(parser=ModelParser(identity_map=identity_map))
+        model = api.parser.model_factory.status
+        users = set([id(s.user) for s in model.parse_list(api, payload)])
+        report(name, measure(lambda: model.parse_list(api, payload)),
+               '(%d user objects)' % len(users))
+
+
+def bench_field_projection():
+    """Parsing a timeline with all fields and projected on a few of them."""
+    from tweepy.parsers import ModelParser
+
+    class Method(object):
+        payload_type = 'status'
+        payload_list = True
+        parameters = {}
+
+    payload = json.dumps(make_timeline())
+    fields = {'status': ['id', 'created_at', 'text', 'retweet_count', 'user'],
+              'user': ['id', 'screen_name', 'followers_count']}
+    print 'field projection (200 statuses, decoding included)'
+    baseline = None
+    for name, parser in [('all fields', ModelParser()),
+                         ('8 projected fields', ModelParser(fields=fields))]:
+        method = Method()
+        method.api = API(parser=parser)
+        seconds = measure(lambda: parser.parse(method, payload))
+        baseline = baseline or seconds
+        report(name, seconds, '(%.1fx)' % (baseline / seconds))
+
+
+def bench_model_encoding():
+    """Pickling a timeline with the compact model encoding and the state dicts."""
+    import cPickle
+    from tweepy.models import Model, Status
+
+    api = API()
+    statuses = Status.parse_list(api, make_timeline())
+
+    compact = Model.__dict__['__reduce_ex__']
+    print 'model encoding (200 statuses, cPickle highest protocol)'
+    for name, reduce_ex in [('state dict', object.__reduce_ex__),
+                            ('compact encoding', compact)]:
+        Model.__reduce_ex__ = reduce_ex
+        try:
+            data = cPickle.dumps(statuses, 2)
+            report(name + ' dumps', measure(lambda: cPickle.dumps(statuses, 2), 20),
+                   '(%d bytes)' % len(data))
+            report(name + ' loads', measure(lambda: cPickle.loads(data), 20))
+        finally:
+            Model.__reduce_ex__ = compact
+
+
+def bench_ids():
+    """Memory and set operations of a million follower ids."""
+    from tweepy.ids import IDArray, IDSet
+
+    rnd = random.Random(0)
+    followers = [rnd.randint(1, 10 ** 9) for i in range(1000000)]
+    friends = followers[:200000] + [rnd.randint(1, 10 ** 9) for i in range(100000)]
+
+    print 'ids (1,000,000 followers, 300,000 friends)'
+    as_list = sys.getsizeof(followers) + sum([sys.getsizeof(i) for i in followers])
+    print '  %-32s %9d bytes' % ('list of ints', as_list)
+    print '  %-32s %9d bytes' % ('IDArray', len(followers) * IDArray().ids.itemsize)
+    report('IDArray from 200 pages', measure(
+        lambda: IDArray.from_pages([followers[i:i + 5000] for i in range(0, 1000000, 5000)]), 3))
+
+    a, b = IDSet(followers), IDSet(friends)
+    report('set(list) & set(list)', measure(lambda: set(followers) & set(friends), 3))
+    report('IDSet & IDSet', measure(lambda: a & b, 3))
+    report('IDSet - IDSet', measure(lambda: a - b, 3))
+    report('1000 lookups in IDSet', measure(lambda: [i in a for i in friends[:1000]], 3))
+
+    from tweepy.diff import diff_ids
+    today = followers[1000:] + [rnd.randint(1, 10 ** 9) for i in range(1000)]
+    b = IDSet(today)
+    report('diff with python sets', measure(
+        lambda: (set(today) - set(followers), set(followers) - set(today)), 3))
+    report('diff_ids of IDSets', measure(lambda: diff_ids(a, b), 3))
+
+
+def bench_graph_snapshot():
+    """Neighbor lookups in a memory mapped snapshot and in a pickled dict."""
+    import os
+    import cPickle
+    import tempfile
+    from tweepy.graph import GraphSnapshotWriter, GraphSnapshot
+
+    rnd = random.Random(0)
+    graph = dict([(node, [rnd.randint(1, 10 ** 9) for i in range(100)])
+                  for node in range(20000)])
+    queries = [rnd.randint(0, 19999) for i in range(1000)]
+    directory = tempfile.mkdtemp()
+    try:
+        pickled = os.path.join(directory, 'graph.pickle')
+        f = open(pickled, 'wb')
+        cPickle.dump(graph, f, 2)
+        f.close()
+        path = os.path.join(directory, 'graph.csr')
+        writer = GraphSnapshotWriter(path)
+        for node, ids in graph.items():
+            writer.add(node, ids)
+        writer.close()
+
+        def from_pickle():
+            f = open(pickled, 'rb')
+            loaded = cPickle.load(f)
+            f.close()
+            for node in queries:
+                loaded[node]
+
+        def from_snapshot():
+            snapshot = GraphSnapshot(path)
+            for node in queries:
+                snapshot.neighbors(node)
+            snapshot.close()
+
+        print 'graph snapshot (20,000 nodes of 100 neighbors, 1000 lookups)'
+        report('pickled dict: load + lookups', measure(from_pickle, 3),
+               '(%d bytes)' % os.path.getsize(pickled))
+        report('snapshot: mmap + lookups', measure(from_snapshot, 3),
+               '(%d bytes)' % os.path.getsize(path))
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+BENCHMARKS = [
+    ('cache_codecs', bench_cache_codecs),
+    ('lazy_models', bench_lazy_models),
+    ('model_memory', bench_model_memory),
+    ('timestamps', bench_timestamps),
+    ('json_backends', bench_json_backends),
+    ('columns', bench_columns),
+    ('identity_map', bench_identity_map),
+    ('field_projection', bench_field_projection),
+    ('model_encoding', bench_model_encoding),
+    ('ids', bench_ids),
+    ('graph_snapshot', bench_graph_snapshot),
+]
+
+
+def main(names):
+    for name, bench in BENCHMARKS:
+        if not names or name in names:
+            bench()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
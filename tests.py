@@ -1,10 +1,20 @@
 import unittest
 import random
+import time
 from time import sleep
 import os
+import sys
+import types
 
 from tweepy import (API, BasicAuthHandler, OAuthHandler, Friendship, Cursor,
-                    MemoryCache, FileCache)
+                    MemoryCache, FileCache, TweepError)
+from tweepy.parsers import ModelParser
+from tweepy.models import (Status, User, LazyStatus, LazyUser, CompactStatus,
+                           CompactUser, CompactPlace, CompactModelFactory,
+                           StatusMixin, UserMixin, PlaceMixin, Model,
+                           ModelFactory)
+from tweepy.cache import (PickleCodec, CompressedCodec, MongodbCache,
+                          MemCacheCache, CacheKey, CacheStats)
 
 """Configurations"""
 # Must supply twitter account credentials for tests
@@ -16,6 +26,40 @@ oauth_token_secret = os.environ.get('ACCESS_SECRET', '')
 
 test_tweet_id = '266367358078169089'
 
+test_user_json = {
+    'id': 783214, 'screen_name': 'twitter', 'name': 'Twitter',
+    'followers_count': 1000, 'following': None,
+    'created_at': 'Tue Feb 20 14:35:54 +0000 2007',
+    'status': {'id': 1, 'text': 'embedded',
+               'created_at': 'Wed Aug 27 13:08:45 +0000 2008'},
+}
+
+test_author_json = dict(test_user_json)
+del test_author_json['status']
+
+test_status_json = {
+    'id': 266367358078169089, 'text': 'RT @twitter: hello',
+    'created_at': 'Thu Nov 08 03:03:09 +0000 2012',
+    'source': '<a href="http://tweepy.org" rel="nofollow">tweepy</a>',
+    'retweet_count': 3, 'place': None,
+    'user': test_author_json,
+    'retweeted_status': {
+        'id': 266367358078169088, 'text': 'hello', 'source': 'web',
+        'created_at': 'Thu Nov 08 03:00:00 +0000 2012',
+        'user': test_author_json,
+    },
+}
+
+
+class FakeMethod(object):
+    """Stands for a bound API method when calling a parser directly"""
+
+    def __init__(self, api, payload_type, payload_list=False, parameters=None):
+        self.api = api
+        self.payload_type = payload_type
+        self.payload_list = payload_list
+        self.parameters = parameters or {}
+
 """Unit tests"""
 
 class TweepyErrorTests(unittest.TestCase):
@@ -358,6 +402,468 @@ class TweepyCursorTests(unittest.TestCase):
         pages = list(Cursor(self.api.followers, 'twitter').pages(5))
         self.assert_(len(pages) == 5)
 
+def fake_page_method(total, page_size=3, delay=0):
+    """A page mode API method returning total ints in pages of page_size"""
+    calls = []
+    def method(*args, **kargs):
+        page = kargs.get('page', 1)
+        calls.append(page)
+        if delay:
+            sleep(delay)
+        start = (page - 1) * page_size
+        return range(start, min(start + page_size, total))
+    method.pagination_mode = 'page'
+    method.calls = calls
+    return method
+
+def fake_cursor_method(total, page_size=3):
+    """A cursor mode API method returning total ints in pages of page_size"""
+    calls = []
+    def method(*args, **kargs):
+        cursor = kargs.get('cursor', -1)
+        calls.append(cursor)
+        index = max(cursor, 1) - 1
+        start = index * page_size
+        next_cursor = index + 2
+        if start + page_size >= total:
+            next_cursor = 0
+        return range(start, min(start + page_size, total)), (index, next_cursor)
+    method.pagination_mode = 'cursor'
+    method.calls = calls
+    return method
+
+class TweepyPaginationTests(unittest.TestCase):
+
+    def testprefetch(self):
+        method = fake_page_method(15)
+        cursor = Cursor(method, prefetch=2)
+        self.assertEqual(list(cursor.items()), range(15))
+        self.assertEqual(len(list(Cursor(method, prefetch=2).pages(3))), 3)
+
+        # errors reach the caller
+        def failing(page=1):
+            if page == 2:
+                raise TweepError('Failed to send request')
+            return [page]
+        failing.pagination_mode = 'page'
+        pages = Cursor(failing, prefetch=3).pages()
+        self.assertEqual(pages.next(), [1])
+        self.assertRaises(TweepError, pages.next)
+        self.assertRaises(StopIteration, pages.next)
+
+        # stopping early stops the worker
+        method = fake_page_method(3000)
+        pages = Cursor(method, prefetch=2).pages()
+        pages.next()
+        pages.close()
+        pages.thread.join(1)
+        self.assertFalse(pages.thread.isAlive())
+        self.assert_(len(method.calls) <= 5)
+
+    def testparallelpages(self):
+        import time
+        method = fake_page_method(47, delay=0.05)
+        start = time.time()
+        pages = list(Cursor(method, parallel=16, count=3).pages())
+        self.assert_(time.time() - start < 0.05 * 8)
+        self.assertEqual(sum(pages, []), range(47))
+        # stops on the short page, without fetching past the window
+        self.assert_(max(method.calls) < 16 + 16)
+
+        # without a page size, short pages do not end the iteration
+        def filtered(page=1):
+            if page > 5:
+                return []
+            return [page] * (page % 2 + 1)
+        filtered.pagination_mode = 'page'
+        self.assertEqual(list(Cursor(filtered, parallel=2).items()),
+                         [1, 1, 2, 3, 3, 4, 5, 5])
+
+        # paging back refetches the window after the previous page
+        pages = Cursor(fake_page_method(30), parallel=3).pages()
+        for i in range(3):
+            pages.next()
+        self.assertEqual(pages.prev(), [3, 4, 5])
+        self.assertEqual(pages.next(), [6, 7, 8])
+        self.assertEqual(pages.next(), [9, 10, 11])
+
+        # stops on an empty page, page size given by count
+        method = fake_page_method(12)
+        self.assertEqual(list(Cursor(method, parallel=3, count=3).items()), range(12))
+        self.assertEqual(len(list(Cursor(method, parallel=3).pages(2))), 2)
+
+        # errors reach the caller
+        def failing(page=1):
+            if page == 2:
+                raise TweepError('Failed to send request')
+            return [page]
+        failing.pagination_mode = 'page'
+        pages = Cursor(failing, parallel=4).pages()
+        self.assertEqual(pages.next(), [1])
+        self.assertRaises(TweepError, pages.next)
+        self.assertRaises(StopIteration, pages.next)
+
+    def testcheckpoints(self):
+        import tempfile, shutil
+        from tweepy.checkpoint import FileCheckpointStore, CacheCheckpointStore
+
+        directory = tempfile.mkdtemp()
+        try:
+            stores = [FileCheckpointStore(directory),
+                      CacheCheckpointStore(MemoryCache(timeout=60))]
+            for store in stores:
+                for make_method in (fake_cursor_method, fake_page_method):
+                    method = make_method(20)
+
+                    # pages are saved once consumed
+                    items = Cursor(method, 'x', checkpoint=store).items()
+                    first = [items.next() for i in range(7)]
+                    resumed = Cursor(method, 'x', checkpoint=store).resume()
+                    self.assertEqual(list(resumed.items()), range(6, 20))
+
+                    # explicit checkpoints save the offset in the page
+                    cursor = Cursor(method, 'y', checkpoint=store)
+                    items = cursor.items()
+                    first = [items.next() for i in range(7)]
+                    token = cursor.checkpoint()
+                    resumed = Cursor(method, 'other', checkpoint=store).resume(token)
+                    self.assertEqual(first + list(resumed.items()), range(20))
+
+                    # finished cursors stay finished
+                    self.assertEqual(list(Cursor(method, 'y', checkpoint=store).resume().items()), [])
+                    store.delete(token)
+                    self.assertEqual(store.load(token), None)
+
+                # pages are saved once consumed
+                method = fake_page_method(20)
+                pages = Cursor(method, checkpoint=store, checkpoint_every=2).pages()
+                for i in range(3):
+                    pages.next()
+                pages.next()
+                resumed = Cursor(method, checkpoint=store).resume().pages()
+                self.assertEqual(resumed.next(), range(6, 9))
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertRaises(TweepError, Cursor(fake_page_method(3)).checkpoint)
+
+    def testidpages(self):
+        from tweepy.checkpoint import CacheCheckpointStore
+
+        api = API()
+        for method in (api.home_timeline, api.user_timeline, api.mentions,
+                       api.list_timeline, api.search):
+            self.assertEqual(method.pagination_mode, 'id')
+        self.assertEqual(api.followers.pagination_mode, 'cursor')
+
+        # timelines can still page by number
+        from tweepy.cursor import PageIterator, ParallelPageIterator
+        self.assertEqual(api.user_timeline.pagination_modes, ['id', 'page'])
+        self.assert_(isinstance(Cursor(api.user_timeline, parallel=4).iterator,
+                                ParallelPageIterator))
+        iterator = Cursor(api.home_timeline, mode='page').iterator
+        self.assertEqual(type(iterator), PageIterator)
+        self.assertRaises(TweepError, Cursor, api.home_timeline, mode='cursor')
+        self.assertRaises(TweepError, Cursor, api.followers_ids, parallel=4)
+
+        # a timeline of ids 1 to 50, where 5 new items arrive between calls
+        timeline = range(1, 51)
+        calls = []
+        def method(*args, **kargs):
+            calls.append(kargs)
+            newest = max(timeline)
+            timeline.extend(range(newest + 1, newest + 6))
+            max_id = kargs.get('max_id', max(timeline))
+            since_id = kargs.get('since_id', 0)
+            items = [i for i in reversed(timeline) if since_id < i <= max_id]
+            return [{'id': i} for i in items[:kargs['count']]]
+        method.pagination_mode = 'id'
+        method.allowed_param = ['since_id', 'max_id', 'count', 'page']
+
+        items = [item['id'] for item in Cursor(method, count=7).items()]
+        self.assertEqual(items, range(55, 0, -1))
+        self.assertEqual(calls[0], {'count': 7})
+        self.assertEqual(calls[1]['max_id'], 48)
+
+        # the largest count is used, and since_id is a floor
+        del calls[:]
+        pages = list(Cursor(method, since_id=40).pages())
+        self.assertEqual(calls[0]['count'], 200)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(pages[0][-1], {'id': 41})
+
+        pages = Cursor(method, count=10).pages()
+        first, second, third = pages.next(), pages.next(), pages.next()
+        self.assertEqual(pages.prev(), second)
+        self.assertEqual(pages.next(), third)
+
+        # checkpoints of id mode cursors
+        store = CacheCheckpointStore(MemoryCache())
+        cursor = Cursor(method, count=10, max_id=100, checkpoint=store)
+        items = cursor.items()
+        first = [items.next()['id'] for i in range(15)]
+        resumed = Cursor(method, checkpoint=store).resume(cursor.checkpoint())
+        self.assertEqual(first + [i['id'] for i in resumed.items()], range(100, 0, -1))
+
+    def testtimelinesync(self):
+        from tweepy.checkpoint import CacheCheckpointStore
+        from tweepy.sync import TimelineSync
+
+        timeline = range(1, 31)
+        calls = []
+        def method(*args, **kargs):
+            calls.append(kargs)
+            max_id = kargs.get('max_id', max(timeline))
+            since_id = kargs.get('since_id', 0)
+            items = [i for i in reversed(timeline) if since_id < i <= max_id]
+            return [{'id': i} for i in items[:kargs['count']]]
+        method.pagination_mode = 'id'
+        method.allowed_param = ['since_id', 'max_id', 'count']
+
+        sync = TimelineSync(CacheCheckpointStore(MemoryCache()), max_pages=2)
+        results = sync.sync(method, count=5)
+        self.assertEqual([i['id'] for i in results], range(30, 25, -1))
+        self.assertEqual((results.since_id, results.max_id, results.gap), (None, 30, False))
+        self.assertEqual(sync.mark(method, count=5), 30)
+
+        # nothing new: one call, down to the mark
+        del calls[:]
+        results = sync.sync(method, count=5)
+        self.assertEqual((list(results), results.gap, len(calls)), ([], False, 1))
+        self.assertEqual(calls[0]['since_id'], 29)
+
+        timeline.extend(range(31, 38))
+        results = sync.sync(method, count=5)
+        self.assertEqual([i['id'] for i in results], range(37, 30, -1))
+        self.assertEqual((results.since_id, results.max_id, results.gap), (30, 37, False))
+
+        # more new items than the page budget
+        timeline.extend(range(38, 58))
+        results = sync.sync(method, count=5)
+        self.assertEqual(len(results), 10)
+        self.assertEqual((results.max_id, results.gap), (57, True))
+
+        # the mark item was deleted: nothing is missing either
+        timeline.remove(57)
+        timeline.extend(range(58, 61))
+        results = sync.sync(method, count=5)
+        self.assertEqual([i['id'] for i in results], [60, 59, 58])
+        self.assertEqual((results.since_id, results.max_id, results.gap), (57, 60, False))
+
+        # marks are per method and parameters
+        self.assertEqual(sync.mark(method, count=6), None)
+        sync.reset(method, count=5)
+        self.assertEqual(sync.mark(method, count=5), None)
+        self.assertRaises(TweepError, sync.sync, fake_page_method(3))
+
+    def testdedupe(self):
+        # a page mode timeline where 2 new items arrive between pages
+        timeline = range(30, 0, -1)
+        def method(*args, **kargs):
+            page = kargs.get('page', 1)
+            items = [{'id': i} for i in timeline[(page - 1) * 5:page * 5]]
+            timeline[0:0] = [max(timeline) + 2, max(timeline) + 1]
+            return items
+        method.pagination_mode = 'page'
+
+        items = Cursor(method).items(dedupe=True, window=10)
+        ids = [item['id'] for item in items]
+        self.assertEqual(ids, range(30, 0, -1))
+        # 2 repeats on each of the 9 pages after the first one
+        self.assertEqual(items.duplicates, 18)
+        self.assert_(len(items.recent) <= 10)
+
+        plain = [item['id'] for item in Cursor(method).items(limit=10)]
+        self.assertNotEqual(len(set(plain)), len(plain))
+
+        # ids pages hold the ids themselves
+        self.assertEqual(list(Cursor(fake_page_method(6, page_size=3)).items(dedupe=True)),
+                         range(6))
+
+class FakeResponse(object):
+
+    def __init__(self, status):
+        self.status = status
+
+class FakeGraphAPI(object):
+    """Serves followers_ids and friends_ids from an adjacency dict"""
+
+    def __init__(self, followers, page_size=2, protected=(), timeouts=()):
+        self.followers = followers
+        self.page_size = page_size
+        self.protected = protected
+        self.timeouts = list(timeouts)
+        self.calls = 0
+
+    def _page(self, ids, cursor):
+        self.calls += 1
+        index = max(cursor, 1) - 1
+        page = ids[index * self.page_size:(index + 1) * self.page_size]
+        next_cursor = index + 2
+        if (index + 1) * self.page_size >= len(ids):
+            next_cursor = 0
+        from tweepy import IDArray
+        return IDArray(page), (index, next_cursor)
+
+    def followers_ids(self, user_id, cursor=-1):
+        if user_id in self.protected:
+            raise TweepError('Not authorized', FakeResponse(401))
+        if user_id in self.timeouts:
+            # fails once
+            self.timeouts.remove(user_id)
+            raise TweepError('Failed to send request: timed out')
+        return self._page(self.followers.get(user_id, []), cursor)
+
+    def friends_ids(self, user_id, cursor=-1):
+        friends = [u for u, ids in sorted(self.followers.items()) if user_id in ids]
+        return self._page(friends, cursor)
+
+class TweepyGraphTests(unittest.TestCase):
+
+    followers = {1: [2, 3, 4], 2: [1, 5], 3: [6, 7, 8, 9], 5: [10], 10: [11]}
+
+    def setUp(self):
+        import tempfile
+        self.directory = tempfile.mkdtemp()
+        self.edge_path = os.path.join(self.directory, 'edges')
+
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.directory)
+
+    def testcrawl(self):
+        from tweepy.graph import GraphCrawler, read_edges
+
+        api = FakeGraphAPI(self.followers, protected=(4,))
+        crawler = GraphCrawler(api, [1], self.edge_path, depth=2, workers=3)
+        self.assert_(crawler.crawl())
+        edges = sorted(read_edges(self.edge_path))
+        self.assertEqual(edges, [(1, 2), (2, 1), (3, 1), (4, 1), (5, 2),
+                                 (6, 3), (7, 3), (8, 3), (9, 3)])
+        self.assertEqual(list(crawler.frontier), [5, 6, 7, 8, 9])
+        self.assertEqual(crawler.errors.keys(), [4])
+        self.assertEqual(os.path.getsize(self.edge_path), 16 * len(edges))
+
+        api = FakeGraphAPI(self.followers)
+        os.remove(self.edge_path)
+        GraphCrawler(api, [10], self.edge_path, direction='friends', depth=3).crawl()
+        self.assertEqual(list(read_edges(self.edge_path)), [(10, 5), (5, 2), (2, 1)])
+
+    def testcrawlfailures(self):
+        from tweepy.graph import GraphCrawler, read_edges
+        from tweepy.checkpoint import FileCheckpointStore
+
+        # a timeout on user 3 leaves it pending instead of skipping it
+        store = FileCheckpointStore(os.path.join(self.directory, 'checkpoints'))
+        api = FakeGraphAPI(self.followers, timeouts=[3])
+        crawler = GraphCrawler(api, [1], self.edge_path, depth=2, store=store)
+        self.failIf(crawler.crawl())
+        self.assertEqual(crawler.errors, {})
+        self.assertEqual(crawler.failures.keys(), [3])
+        self.failIf(3 in crawler.done)
+
+        crawler = GraphCrawler(api, [1], self.edge_path, depth=2, store=store)
+        self.assert_(crawler.crawl())
+        self.assertEqual(crawler.failures, {})
+        complete = FakeGraphAPI(self.followers)
+        GraphCrawler(complete, [1], self.edge_path + '2', depth=2).crawl()
+        self.assertEqual(sorted(read_edges(self.edge_path)),
+                         sorted(read_edges(self.edge_path + '2')))
+
+    def testresume(self):
+        from tweepy.graph import GraphCrawler, read_edges
+        from tweepy.checkpoint import FileCheckpointStore
+
+        store = FileCheckpointStore(os.path.join(self.directory, 'checkpoints'))
+        api = FakeGraphAPI(self.followers, page_size=1)
+        crawler = GraphCrawler(api, [1], self.edge_path, depth=3, budget=8,
+                               workers=1, store=store, checkpoint_every=1)
+        self.failIf(crawler.crawl())
+        self.assertEqual(api.calls, 8)
+
+        # a new crawler with more budget continues from the checkpoint
+        crawler = GraphCrawler(api, [1], self.edge_path, depth=3, budget=100,
+                               workers=2, store=store)
+        self.assert_(crawler.crawl())
+        complete = FakeGraphAPI(self.followers)
+        GraphCrawler(complete, [1], self.edge_path + '2', depth=3).crawl()
+        self.assertEqual(sorted(read_edges(self.edge_path)),
+                         sorted(read_edges(self.edge_path + '2')))
+        # user 3 was cut short by the budget and is fetched again
+        self.assertEqual(api.calls, 8 + 4 + 1 + 5)
+
+    def testsnapshotdiff(self):
+        from tweepy import IDSet
+        from tweepy.diff import diff_ids, hydrate_users, SnapshotHistory
+
+        added, removed = diff_ids([5, 1, 3, 2 ** 40], [3, 4, 5, 2 ** 41])
+        self.assertEqual((added, removed), ([4, 2 ** 41], [1, 2 ** 40]))
+
+        history = SnapshotHistory(os.path.join(self.directory, 'history'), keep=2)
+        self.assertEqual(history.load('followers:1'), None)
+        self.assertEqual(history.update('followers:1', range(10), 100), ([], []))
+        self.assertEqual(history.update('followers:1', range(5, 15), 200),
+                         (range(10, 15), range(5)))
+        history.save('followers:1', range(20), 300)
+        self.assertEqual(history.timestamps('followers:1'), [200, 300])
+        self.assertEqual(history.load('followers:1'), range(20))
+        new = range(5) + range(15, 20)
+        self.assertEqual(history.diff('followers:1'), (new, []))
+        self.assertEqual(history.diff('followers:1', 300, 200), ([], new))
+
+        class LookupAPI(object):
+            batches = []
+            def lookup_users(self, user_ids=None, screen_names=None):
+                self.batches.append(len(user_ids))
+                return [User.parse(None, {'id': i}) for i in user_ids]
+        api = LookupAPI()
+        users = list(hydrate_users(api, IDSet(range(250))))
+        self.assertEqual([u.id for u in users], range(250))
+        self.assertEqual(api.batches, [100, 100, 50])
+
+    def testgraphsnapshot(self):
+        from tweepy.graph import GraphSnapshotWriter, GraphSnapshot
+
+        path = os.path.join(self.directory, 'graph')
+        writer = GraphSnapshotWriter(path)
+        writer.add(3, [9, 7, 8, 6, 2 ** 40])
+        api = FakeGraphAPI(self.followers)
+        writer.add_pages(1, [api.followers_ids(1, cursor=c)[0] for c in (-1, 2)])
+        writer.add(10, [])
+        writer.close()
+
+        graph = GraphSnapshot(path)
+        try:
+            self.assertEqual(len(graph), 3)
+            self.assertEqual(list(graph), [1, 3, 10])
+            self.assertEqual(graph.neighbors(1), [2, 3, 4])
+            self.assertEqual(graph.neighbors(3), [6, 7, 8, 9, 2 ** 40])
+            self.assertEqual(graph.neighbors(10), [])
+            self.assertEqual(graph.degree(3), 5)
+            self.assert_(3 in graph and 2 not in graph and 11 not in graph)
+            self.assertRaises(KeyError, graph.neighbors, 2)
+            self.assertEqual(graph.get(2), None)
+            self.assertEqual(graph.common_neighbors(1, 3), [])
+        finally:
+            graph.close()
+
+        writer = GraphSnapshotWriter(path + '2')
+        writer.add(1, [2])
+        writer.add(1, [3])
+        self.assertRaises(TweepError, writer.close)
+        f = open(path + '3', 'wb')
+        f.write('not a graph')
+        f.close()
+        self.assertRaises(TweepError, GraphSnapshot, path + '3')
+
+    def testratelimit(self):
+        from tweepy.graph import RateLimiter
+        limiter = RateLimiter(2, 0.2)
+        start = time.time()
+        for i in range(5):
+            limiter.acquire()
+        self.assert_(time.time() - start >= 0.4)
+
 class TweepyAuthTests(unittest.TestCase):
 
     def testoauth(self):
@@ -377,6 +883,428 @@ class TweepyAuthTests(unittest.TestCase):
         api.destroy_status(s.id)
 
 
+class TweepyUtilsTests(unittest.TestCase):
+
+    def testparsedatetime(self):
+        from datetime import datetime
+        from tweepy.utils import (parse_datetime, parse_datetimes,
+                                  parse_search_datetime, _datetime_cache)
+        self.assertEqual(parse_datetime('Wed Aug 27 13:08:45 +0000 2008'),
+                         datetime(2008, 8, 27, 13, 8, 45))
+        _datetime_cache.clear()
+        self.assertEqual(parse_datetimes(['Thu Nov 08 03:03:09 +0000 2012',
+                                          'Sun Dec 01 00:00:00 +0000 2013']),
+                         [datetime(2012, 11, 8, 3, 3, 9), datetime(2013, 12, 1)])
+        self.assertEqual(parse_search_datetime('Wed, 27 Aug 2008 13:08:45 +0000'),
+                         datetime(2008, 8, 27, 13, 8, 45))
+
+        for invalid in ('Wed Aug 27 13:08:45 +0100 2008', 'Wed Foo 27 13:08:45 +0000 2008',
+                        'Wed Aug 32 13:08:45 +0000 2008', '2008-08-27 13:08:45'):
+            self.assertRaises(ValueError, parse_datetime, invalid)
+        self.assertRaises(ValueError, parse_search_datetime, 'Wed Aug 27 13:08:45 +0000 2008')
+
+    def testjsonbackends(self):
+        from tweepy.utils import (get_json_backend, register_json_backend,
+                                  json_backends, JSONBackend)
+        from tweepy.parsers import JSONParser
+        import json
+
+        backend = get_json_backend()
+        self.assertEqual(backend.loads('{"id": 1}'), {'id': 1})
+        self.assertEqual(backend.loads(bytearray('[1, 2]')), [1, 2])
+        self.assertEqual(get_json_backend('json').loads('[1]'), [1])
+        self.assertRaises(ImportError, get_json_backend, 'nosuchjson')
+
+        calls = []
+        def loads(data):
+            calls.append(data)
+            return json.loads(data)
+        register_json_backend('counting', lambda: JSONBackend('counting', loads, json.dumps))
+        try:
+            self.assertEqual(get_json_backend().name, 'counting')
+            parser = JSONParser(json_backend='counting')
+            parser.json_lib.loads('{}')
+            self.assertEqual(calls, ['{}'])
+            self.assertEqual(ModelParser(json_backend='json').json_lib.name, 'json')
+        finally:
+            del json_backends[0]
+
+class TweepyModelTests(unittest.TestCase):
+
+    def testlazymodels(self):
+        eager = ModelParser()
+        lazy = ModelParser(lazy=True)
+        s1 = Status.parse(API(parser=eager), test_status_json)
+        s2 = lazy.model_factory.status.parse(API(parser=lazy), test_status_json)
+        self.assert_(isinstance(s2, LazyStatus))
+        self.assert_(isinstance(s2, Status))
+
+        # nothing is converted until accessed
+        self.assertFalse('created_at' in s2.__dict__)
+        for attr in ('id', 'text', 'created_at', 'source', 'source_url',
+                     'retweet_count', 'place'):
+            self.assertEqual(getattr(s1, attr), getattr(s2, attr))
+        self.assert_(isinstance(s2.author, LazyUser))
+        self.assert_(s2.author is s2.user)
+        self.assertEqual(s2.user.created_at, s1.user.created_at)
+        self.assertEqual(s2.user.following, False)
+        self.assert_(isinstance(s2.retweeted_status, LazyStatus))
+        self.assertEqual(s2.retweeted_status.source_url, None)
+        self.assertFalse(hasattr(s2, 'favorited'))
+
+        user = LazyUser.parse(None, test_user_json)
+        self.assertEqual(user.status.created_at, User.parse(None, test_user_json).status.created_at)
+
+    def testlazymodelpickle(self):
+        import pickle
+        api = API(parser=ModelParser(lazy=True))
+        status = api.parser.model_factory.status.parse(api, test_status_json)
+        status.text
+        status = pickle.loads(pickle.dumps(status))
+        self.assertEqual(status.text, test_status_json['text'])
+        self.assertEqual(status.user.screen_name, 'twitter')
+        self.assert_(isinstance(status.user, LazyUser))
+        self.assert_(isinstance(status.retweeted_status.user, LazyUser))
+
+    def testcompactmodels(self):
+        import pickle
+        api = API(parser=ModelParser(CompactModelFactory))
+        place = {'id': 'c3f37afa9efcf94b', 'full_name': 'Austin, TX',
+                 'bounding_box': None, 'contained_within': []}
+        status = CompactStatus.parse(api, dict(test_status_json, place=place))
+        eager = Status.parse(API(), test_status_json)
+
+        self.assertFalse(hasattr(status, '__dict__'))
+        self.assert_(isinstance(status, StatusMixin))
+        self.assert_(isinstance(status.user, UserMixin))
+        self.assert_(isinstance(status.place, PlaceMixin))
+        for name, value in User.__dict__.items():
+            if callable(value):
+                self.assert_(callable(getattr(CompactUser, name, None)), name)
+        self.assert_(isinstance(status.user, CompactUser))
+        self.assert_(isinstance(status.place, CompactPlace))
+        self.assert_(isinstance(status.retweeted_status, CompactStatus))
+        for attr in ('id', 'text', 'created_at', 'source', 'source_url'):
+            self.assertEqual(getattr(status, attr), getattr(eager, attr))
+        self.assertEqual(status.author.following, False)
+        user = CompactUser.parse(None, test_user_json)
+        self.assert_(isinstance(user.status, CompactStatus))
+        self.assertEqual(user.status.created_at, User.parse(None, test_user_json).status.created_at)
+        self.assertEqual(status.place.full_name, 'Austin, TX')
+        self.assertFalse(hasattr(status, 'favorited'))
+
+        # unknown fields go to the overflow dict
+        status.withheld_in_countries = ['DE']
+        self.assertEqual(status.withheld_in_countries, ['DE'])
+        del status.withheld_in_countries
+        self.assertFalse(hasattr(status, 'withheld_in_countries'))
+        status.withheld_in_countries = ['FR']
+
+        for protocol in (0, 2):
+            copy = pickle.loads(pickle.dumps(status, protocol))
+            self.assertEqual(copy.text, status.text)
+            self.assertEqual(copy.user.screen_name, 'twitter')
+            self.assertEqual(copy.withheld_in_countries, ['FR'])
+            self.assertFalse(hasattr(copy, '_api'))
+
+    def testlazyresultset(self):
+        import json
+        from tweepy.models import LazyResultSet
+        from tweepy.cursor import ItemIterator
+
+        parser = ModelParser(lazy_results=True)
+        api = API(parser=parser)
+        payload = json.dumps([test_status_json, dict(test_status_json, id=2)])
+        results = parser.parse(FakeMethod(api, 'status', True), payload)
+        self.assert_(isinstance(results, LazyResultSet))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[1].id, 2)
+        self.assertEqual([s.id for s in results], [test_status_json['id'], 2])
+        self.assertEqual([s.id for s in results[:1]], [test_status_json['id']])
+
+        # search results keep their metadata
+        payload = json.dumps({'results': [{'id': 5, 'text': 'found'}],
+                              'max_id': 5, 'query': 'tweepy'})
+        results = parser.parse(FakeMethod(api, 'search_result', True), payload)
+        self.assertEqual((results.max_id, results.query), (5, 'tweepy'))
+        self.assertEqual(results[0].text, 'found')
+
+        # pages can be consumed by ItemIterator directly
+        pages = iter([results, LazyResultSet(Status, api, [test_status_json])])
+        class Pages(object):
+            def next(self):
+                return pages.next()
+        items = ItemIterator(Pages())
+        self.assertEqual([i.id for i in items], [5, test_status_json['id']])
+
+        # id mode pages by the ids of the JSON, without parsing models
+        parsed = []
+        class CountingStatus(Status):
+            @classmethod
+            def parse(cls, api, json):
+                parsed.append(json['id'])
+                return Status.parse.im_func(cls, api, json)
+        status_json = dict(test_status_json)
+        del status_json['retweeted_status']
+        def timeline(*args, **kargs):
+            max_id = kargs.get('max_id', 10)
+            return LazyResultSet(CountingStatus, api,
+                [dict(status_json, id=i) for i in range(max_id, max(max_id - 5, 0), -1)])
+        timeline.pagination_mode = 'id'
+        self.assertEqual([s.id for s in Cursor(timeline).items(limit=1)], [10])
+        self.assertEqual(parsed, [10])
+        self.assertEqual(len(list(Cursor(timeline).items())), 10)
+
+    def testtocolumns(self):
+        import calendar
+        from array import array
+        from tweepy.models import ResultSet, LazyResultSet
+        from tweepy.columns import ColumnBuilder
+
+        api = API()
+        fields = ['id', 'created_at', 'user.followers_count', 'retweet_count', 'text']
+        second = dict(test_status_json, id=2, retweet_count=None)
+        statuses = ResultSet([Status.parse(api, test_status_json), Status.parse(api, second)])
+        epoch = calendar.timegm((2012, 11, 8, 3, 3, 9, 0, 0, 0))
+
+        columns = statuses.to_columns(fields, use_numpy=False)
+        self.assert_(isinstance(columns['id'], array))
+        self.assertEqual(columns['id'].itemsize, 8)
+        self.assertEqual(list(columns['id']), [test_status_json['id'], 2])
+        self.assertEqual(list(columns['created_at']), [epoch, epoch])
+        self.assertEqual(list(columns['user.followers_count']), [1000, 1000])
+        self.assertEqual(list(columns['retweet_count']), [3, 0])
+        self.assertEqual(columns['text'], [test_status_json['text']] * 2)
+
+        # raw JSON pages, lazy pages and models give the same columns
+        builder = ColumnBuilder(fields, use_numpy=False)
+        builder.add([test_status_json])
+        builder.add(LazyResultSet(Status, api, [second]))
+        self.assertEqual(builder.columns(), columns)
+
+    def testidentitymap(self):
+        from tweepy import IdentityMap
+
+        identity_map = IdentityMap(size=4)
+        api = API(parser=ModelParser(identity_map=identity_map))
+        statuses = Status.parse_list(api, [test_status_json, dict(test_status_json, id=2)])
+        self.assert_(statuses[0].user is statuses[1].user)
+        self.assert_(statuses[0].user is statuses[0].retweeted_status.user)
+        self.assertEqual(identity_map.hits, 3)
+
+        # newer data updates the shared user in place
+        author = dict(test_author_json, followers_count=2000)
+        status = Status.parse(api, dict(test_status_json, user=author))
+        self.assert_(status.user is statuses[0].user)
+        self.assertEqual(statuses[0].user.followers_count, 2000)
+        self.assertEqual(identity_map.updates, 1)
+
+        # the map is bounded
+        for i in range(10):
+            Status.parse(api, dict(test_status_json, user=dict(test_author_json, id=i)))
+        self.assert_(len(identity_map) <= 4)
+        self.assertEqual(identity_map.get(User, 9).id, 9)
+        self.assertEqual(identity_map.get(User, 0), None)
+
+    def testidentitymapcompact(self):
+        from tweepy import IdentityMap
+
+        identity_map = IdentityMap()
+        api = API(parser=ModelParser(CompactModelFactory, identity_map=identity_map))
+        place = {'id': 'c3f37afa9efcf94b', 'full_name': 'Austin, TX'}
+        statuses = CompactStatus.parse_list(api,
+            [dict(test_status_json, id=i, place=place) for i in range(50)])
+        self.assertEqual(len(set([id(s.user) for s in statuses])), 1)
+        self.assertEqual(len(set([id(s.place) for s in statuses])), 1)
+        self.assert_(identity_map.get(CompactUser, test_author_json['id']) is statuses[0].user)
+        self.assert_(identity_map.get(CompactPlace, place['id']) is statuses[0].place)
+
+        # models of the factory are interned by role, whatever their class
+        class Author(Model):
+            @classmethod
+            def parse(cls, api, json):
+                author = cls(api)
+                author.id = json['id']
+                return author
+        class AuthorFactory(ModelFactory):
+            user = Author
+        identity_map = IdentityMap()
+        api = API(parser=ModelParser(AuthorFactory, identity_map=identity_map))
+        statuses = Status.parse_list(api, [test_status_json, dict(test_status_json, id=2)])
+        self.assert_(statuses[0].user is statuses[1].user)
+        self.assert_(identity_map.get(Author, test_author_json['id']) is statuses[0].user)
+
+    def testfieldprojection(self):
+        import json
+        fields = {'status': ['id', 'text', 'user', 'retweeted_status'],
+                  'user': ['id', 'screen_name']}
+        parser = ModelParser(fields=fields)
+        api = API(parser=parser)
+        payload = json.dumps([test_status_json])
+        status = parser.parse(FakeMethod(api, 'status', True), payload)[0]
+        self.assertEqual(status.text, test_status_json['text'])
+        self.assertEqual(status.user.screen_name, 'twitter')
+        self.assertEqual(status.retweeted_status.user.id, 783214)
+        for attr in ('created_at', 'source'):
+            self.assertFalse(hasattr(status, attr))
+            self.assertFalse(hasattr(status.retweeted_status, attr))
+        self.assertFalse(hasattr(status.user, 'followers_count'))
+
+        # per call fields, given as a list for the payload type
+        method = FakeMethod(api, 'user')
+        method.fields = ['id', 'followers_count']
+        user = parser.parse(method, json.dumps(test_user_json))
+        self.assertEqual(user.followers_count, 1000)
+        self.assertFalse(hasattr(user, 'screen_name'))
+        self.assertFalse(hasattr(user, 'status'))
+
+    def testretainjson(self):
+        import json
+        from tweepy.streaming import StreamListener
+
+        parser = ModelParser(retain_json=True)
+        api = API(parser=parser)
+        payload = json.dumps([test_status_json, None, dict(test_status_json, id=2)])
+        results = parser.parse(FakeMethod(api, 'status', True), payload)
+        self.assert_(results._payload is payload)
+        self.assertEqual([s._json['id'] for s in results], [test_status_json['id'], 2])
+        self.assertEqual(json.loads(json.dumps(results[0]._json)), test_status_json)
+
+        payload = json.dumps(test_user_json)
+        user = parser.parse(FakeMethod(api, 'user'), payload)
+        self.assertEqual((user._json, user._payload), (test_user_json, payload))
+
+        statuses = []
+        class Listener(StreamListener):
+            def on_status(self, status):
+                statuses.append(status)
+        data = json.dumps(dict(test_status_json, in_reply_to_status_id=None))
+        Listener(api).on_data(data)
+        self.assertEqual(statuses[0]._payload, data)
+        self.assertEqual(statuses[0]._json['text'], test_status_json['text'])
+
+        # the retained JSON is not pickled into cache entries
+        import pickle
+        for protocol in (0, 2):
+            copy = pickle.loads(pickle.dumps(results, protocol))
+            self.assertFalse(hasattr(copy, '_payload'))
+            self.assertFalse(hasattr(copy[0], '_json'))
+        compact_parser = ModelParser(CompactModelFactory, retain_json=True)
+        compacts = compact_parser.parse(FakeMethod(api, 'status', True),
+                                        json.dumps([test_status_json]))
+        self.assert_(hasattr(compacts[0], '_json'))
+        self.assertFalse(hasattr(pickle.loads(pickle.dumps(compacts, 2))[0], '_json'))
+
+    def testcompactencoding(self):
+        import pickle
+        from tweepy.models import Model, DirectMessage, List, \
+                MODEL_ENCODING_VERSION, _rebuild_model
+        from tweepy.error import TweepError
+
+        api = API()
+        place = {'id': 'c3f37afa9efcf94b', 'full_name': 'Austin, TX',
+                 'bounding_box': None, 'contained_within': []}
+        status = Status.parse(api, dict(test_status_json, place=place))
+        status.withheld_in_countries = ['DE']
+        dm = DirectMessage.parse(api, {'id': 7, 'text': 'hi', 'sender': test_author_json,
+                                       'created_at': test_status_json['created_at']})
+        lst = List.parse(api, {'id': 8, 'slug': 'team', 'user': test_author_json})
+        compact = CompactStatus.parse(api, test_status_json)
+
+        for obj in (status, status.user, dm, lst, status.place, compact):
+            reduced = obj.__reduce_ex__(2)
+            self.assertEqual(reduced[0], _rebuild_model)
+            self.assertEqual(reduced[1][1], MODEL_ENCODING_VERSION)
+            for protocol in (0, 2):
+                copy = pickle.loads(pickle.dumps(obj, protocol))
+                self.assertEqual(type(copy), type(obj))
+                state = copy.__getstate__()
+                self.assertEqual(sorted(state), sorted(obj.__getstate__()))
+                for k, v in obj.__getstate__().items():
+                    if not isinstance(v, Model):
+                        self.assertEqual(state[k], v)
+                self.assertFalse(hasattr(copy, '_api'))
+
+        copy = pickle.loads(pickle.dumps(status, 2))
+        self.assertEqual(copy.created_at, status.created_at)
+        self.assertEqual(copy.withheld_in_countries, ['DE'])
+        self.assert_(copy.user is copy.author)
+        self.assertEqual(copy.place.full_name, 'Austin, TX')
+        self.assertRaises(TweepError, _rebuild_model, Status, 0, 0, (), None)
+
+    def testidcontainers(self):
+        import json
+        import pickle
+        from tweepy import IDArray, IDSet
+
+        parser = ModelParser()
+        api = API(parser=parser)
+        method = FakeMethod(api, 'ids', parameters={'cursor': -1})
+        ids, cursors = parser.parse(method, json.dumps(
+            {'ids': [5, 3, 2 ** 40], 'previous_cursor': 0, 'next_cursor': 7}))
+        self.assert_(isinstance(ids, IDArray))
+        self.assertEqual(ids.ids.itemsize, 8)
+        self.assertEqual(list(ids), [5, 3, 2 ** 40])
+        self.assertEqual(ids, [5, 3, 2 ** 40])
+        self.assertEqual(ids[1:], [3, 2 ** 40])
+        self.assertEqual(cursors, (0, 7))
+
+        pages = IDArray.from_pages([ids, IDArray([9, 3])])
+        self.assertEqual(pages, [5, 3, 2 ** 40, 9, 3])
+        self.assertEqual(pickle.loads(pickle.dumps(pages)), pages)
+
+        a = IDSet.from_pages([ids, IDArray([9, 3])])
+        b = IDSet([3, 4, 9, 10])
+        self.assertEqual(list(a), [3, 5, 9, 2 ** 40])
+        self.assert_(9 in a and 2 ** 40 in a and 4 not in a and 11 not in a)
+        self.assertEqual(a | b, [3, 4, 5, 9, 10, 2 ** 40])
+        self.assertEqual(a & b, [3, 9])
+        self.assertEqual(a - b, [5, 2 ** 40])
+        self.assertEqual(b - a, [4, 10])
+        self.assertEqual(IDSet(range(1000)) & [10, 500, 2000], [10, 500])
+        self.assert_(IDSet([3, 9]).issubset(a))
+        copy = pickle.loads(pickle.dumps(a, 2))
+        self.assert_(isinstance(copy, IDSet))
+        self.assertEqual(copy, a)
+        import cPickle
+        for module in (pickle, cPickle):
+            for protocol in (0, 1, 2):
+                for empty in (IDArray(), IDSet()):
+                    copy = module.loads(module.dumps(empty, protocol))
+                    self.assertEqual(type(copy), type(empty))
+                    self.assertEqual(copy, [])
+                    copy.append(3)
+                    self.assertEqual(copy, [3])
+
+    def testidcontainerswithoutint64(self):
+        import json
+        import pickle
+        import tweepy.ids
+        from tweepy import IDArray, IDSet
+        from tweepy.diff import diff_ids
+
+        pickled = pickle.dumps(IDSet([3, 2 ** 40]))
+        saved = tweepy.ids.INT64_TYPECODE
+        # ex: python 2 on windows, where 'l' arrays are 32 bit
+        tweepy.ids.INT64_TYPECODE = None
+        try:
+            parser = ModelParser()
+            method = FakeMethod(API(parser=parser), 'ids', parameters={'cursor': -1})
+            ids, cursors = parser.parse(method, json.dumps(
+                {'ids': [5, 3, 2 ** 40], 'previous_cursor': 0, 'next_cursor': 7}))
+            self.assert_(isinstance(ids.ids, list))
+            self.assertEqual(ids, [5, 3, 2 ** 40])
+            a = ids.to_set()
+            self.assertEqual(a | IDSet([4]), [3, 4, 5, 2 ** 40])
+            self.assert_(2 ** 40 in a)
+            self.assertEqual(diff_ids(a, [3, 4]), ([4], [5, 2 ** 40]))
+            copy = pickle.loads(pickled)
+            self.assertEqual(copy.ids, [3, 2 ** 40])
+            self.assertEqual(pickle.loads(pickle.dumps(copy)), copy)
+        finally:
+            tweepy.ids.INT64_TYPECODE = saved
+        self.assertEqual(pickle.loads(pickle.dumps(copy)).ids.itemsize, 8)
+
 class TweepyCacheTests(unittest.TestCase):
 
     timeout = 2.0
@@ -420,5 +1348,438 @@ class TweepyCacheTests(unittest.TestCase):
         self.cache.flush()
         os.rmdir('cache_test_dir')
 
+class TweepyCacheCodecTests(unittest.TestCase):
+
+    value = {'text': 'x' * 2048, 'ids': range(100)}
+
+    def testpicklecodec(self):
+        codec = PickleCodec()
+        self.assertEqual(codec.decode(codec.encode(self.value)), self.value)
+
+        # entries written with the old default protocol must still load
+        import pickle
+        self.assertEqual(codec.decode(pickle.dumps(self.value)), self.value)
+
+    def testcompressedcodec(self):
+        codec = CompressedCodec(threshold=1024)
+        data = codec.encode(self.value)
+        self.assertEqual(data[0], CompressedCodec.COMPRESSED)
+        self.assert_(len(data) < len(PickleCodec().encode(self.value)))
+        self.assertEqual(codec.decode(data), self.value)
+
+        # small entries are stored as is
+        data = codec.encode('small')
+        self.assertEqual(data[0], CompressedCodec.PLAIN)
+        self.assertEqual(codec.decode(data), 'small')
+
+    def testfilecachecodec(self):
+        os.mkdir('cache_test_dir')
+        try:
+            cache = FileCache('cache_test_dir', codec=CompressedCodec())
+            cache.store('testkey', self.value)
+            self.assertEqual(cache.get('testkey'), self.value)
+            cache.flush()
+
+            # entries written before compression was enabled still load
+            FileCache('cache_test_dir').store('testkey', self.value)
+            self.assertEqual(cache.get('testkey'), self.value)
+
+            # entries another codec can not read are misses
+            class JSONCodec(object):
+                def encode(self, value):
+                    import json
+                    return json.dumps(value)
+            FileCache('cache_test_dir', codec=JSONCodec()).store('testkey', self.value)
+            self.assertEqual(cache.get('testkey'), None)
+            self.assertEqual(cache.count(), 0)
+            self.assertEqual(cache.stats.snapshot()['misses'], 1)
+        finally:
+            cache.flush()
+            os.rmdir('cache_test_dir')
+
+class TweepyCacheStatsTests(unittest.TestCase):
+
+    def _run_tests(self, cache):
+        url = '/1/statuses/home_timeline.json?count=20'
+        cache.store(url, 'timeline')
+        cache.get(url)
+        cache.get('/1/users/show.json?id=1')
+        sleep(0.01)
+        cache.get(url, timeout=0.001)
+
+        stats = cache.stats.snapshot()
+        self.assertEqual(stats['stores'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['stale'], 1)
+        self.assertEqual(stats['evictions'], 1)
+        self.assert_(stats['get_time'] >= 0)
+
+        timeline = stats['endpoints']['/1/statuses/home_timeline.json']
+        self.assertEqual(timeline['hits'], 1)
+        self.assertEqual(timeline['misses'], 0)
+        self.assertEqual(stats['endpoints']['/1/users/show.json']['misses'], 1)
+
+        cache.stats.reset()
+        stats = cache.stats.snapshot()
+        self.assertEqual(stats['hits'], 0)
+        self.assertEqual(stats['endpoints'], {})
+
+    def testmemorycachestats(self):
+        self._run_tests(MemoryCache())
+
+    def testendpointkeys(self):
+        import pickle
+        cache = MemoryCache()
+        for id in range(5):
+            key = CacheKey('/1/statuses/show/%d.json#fields=(\'id\',)' % id,
+                           '/1/statuses/show/{id}.json')
+            cache.store(key, id)
+            self.assertEqual(cache.get(key), id)
+        cache.get('/1/users/show.json?id=1#fields=(\'id\',)')
+        endpoints = cache.stats.snapshot()['endpoints']
+        self.assertEqual(sorted(endpoints.keys()),
+                         ['/1/statuses/show/{id}.json', '/1/users/show.json'])
+        self.assertEqual(endpoints['/1/statuses/show/{id}.json']['stores'], 5)
+        self.assertEqual(pickle.loads(pickle.dumps(key)), str(key))
+
+        # the table of endpoints stays bounded
+        cache.stats.reset()
+        cache.stats.MAX_ENDPOINTS = 3
+        for id in range(10):
+            cache.get('/1/direct_messages/show/%d.json' % id)
+        endpoints = cache.stats.snapshot()['endpoints']
+        self.assertEqual(len(endpoints), 4)
+        self.assertEqual(endpoints[CacheStats.OTHER]['misses'], 7)
+
+    def testfilecachestats(self):
+        os.mkdir('cache_test_dir')
+        try:
+            cache = FileCache('cache_test_dir')
+            self._run_tests(cache)
+            self.assert_(cache.stats.snapshot()['bytes_stored'] == 0)
+            cache.store('key', 'value')
+            self.assert_(cache.stats.snapshot()['bytes_stored'] > 0)
+            cache.flush()
+        finally:
+            os.rmdir('cache_test_dir')
+
+class TweepyCacheSnapshotTests(unittest.TestCase):
+
+    snapshot = 'cache_test_snapshot'
+
+    def tearDown(self):
+        if os.path.exists(self.snapshot):
+            os.remove(self.snapshot)
+
+    def _export(self):
+        cache = MemoryCache(timeout=60)
+        for i in range(10):
+            cache.store('/1/statuses/show.json?id=%i' % i, {'id': i})
+        # expired entries are not exported
+        cache._entries['old'] = (0, 'expired')
+        self.assertEqual(cache.export_snapshot(self.snapshot), 10)
+        return cache
+
+    def testsnapshot(self):
+        original = self._export()
+        for lazy in (True, False):
+            cache = MemoryCache(timeout=60)
+            self.assertEqual(cache.import_snapshot(self.snapshot, lazy), 10)
+            self.assertEqual(cache.count(), 10)
+            self.assertEqual(cache.get('/1/statuses/show.json?id=3'), {'id': 3})
+            self.assertEqual(cache.get('old'), None)
+
+            # remaining time to live is kept
+            key = '/1/statuses/show.json?id=5'
+            self.assertEqual(cache._entries[key][0], original._entries[key][0])
+
+    def testsnapshotskipsexpired(self):
+        self._export()
+        cache = MemoryCache(timeout=60)
+        cache.timeout = 0.001
+        sleep(0.01)
+        self.assertEqual(cache.import_snapshot(self.snapshot), 0)
+
+    def testlazysnapshotpickle(self):
+        import pickle
+        self._export()
+        cache = MemoryCache(timeout=60)
+        cache.import_snapshot(self.snapshot)
+        cache = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(cache.get('/1/statuses/show.json?id=1'), {'id': 1})
+
+    def testsnapshotreplace(self):
+        import pickle
+        cache = MemoryCache(timeout=60, codec=CompressedCodec(threshold=1))
+        cache.store('key', 'first')
+        cache.export_snapshot(self.snapshot)
+        cache.store('key', 'second')
+        # as on windows, where renaming over a file fails
+        name = os.name
+        os.name = 'nt'
+        try:
+            self.assertEqual(cache.export_snapshot(self.snapshot), 1)
+        finally:
+            os.name = name
+        self.failIf(os.path.exists(self.snapshot + '.tmp'))
+        restored = MemoryCache(timeout=60, codec=CompressedCodec())
+        restored.import_snapshot(self.snapshot, lazy=False)
+        self.assertEqual(restored.get('key'), 'second')
+
+        # the codec is pickled with the cache
+        copy = pickle.loads(pickle.dumps(cache))
+        self.assert_(isinstance(copy.codec, CompressedCodec))
+        self.assertEqual(copy.codec.threshold, 1)
+        self.assertEqual(copy.get('key'), 'second')
+
+class FakeMongoCollection(object):
+    """In-memory stand-in for the parts of a pymongo collection used by MongodbCache"""
+
+    def __init__(self):
+        self.docs = {}
+        self.indexes = {}
+        self.round_trips = 0
+
+    def _matches(self, doc, spec):
+        for field, cond in spec.items():
+            value = doc.get(field)
+            if isinstance(cond, dict):
+                if '$in' in cond and value not in cond['$in']:
+                    return False
+                if '$lte' in cond and not value <= cond['$lte']:
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+    def _project(self, doc, fields):
+        if fields is None:
+            return dict(doc)
+        return dict([(k, v) for k, v in doc.items() if k == '_id' or k in fields])
+
+    def create_index(self, field, **options):
+        self.indexes[field] = options
+
+    def index_information(self):
+        return dict([(field + '_1', dict(options)) for field, options in self.indexes.items()])
+
+    def drop_index(self, name):
+        del self.indexes[name[:-2]]
+
+    def update(self, spec, doc, upsert=False):
+        self.round_trips += 1
+        doc = dict(doc, _id=spec['_id'])
+        if upsert or spec['_id'] in self.docs:
+            self.docs[spec['_id']] = doc
+
+    def find(self, spec, fields=None):
+        self.round_trips += 1
+        return FakeMongoCursor([self._project(d, fields) for d in self.docs.values()
+                                if self._matches(d, spec)])
+
+    def find_one(self, spec, fields=None):
+        for doc in self.find(spec, fields):
+            return doc
+
+    def remove(self, spec):
+        self.round_trips += 1
+        removed = [k for k, d in self.docs.items() if self._matches(d, spec)]
+        for key in removed:
+            del self.docs[key]
+        return {'n': len(removed)}
+
+    def drop(self):
+        self.docs.clear()
+        self.indexes.clear()
+
+    def initialize_unordered_bulk_op(self):
+        return FakeMongoBulk(self)
+
+
+class FakeMongoCursor(list):
+
+    def count(self):
+        return len(self)
+
+
+class FakeMongoBulk(object):
+
+    def __init__(self, col):
+        self.col = col
+        self.ops = []
+
+    def find(self, spec):
+        self.spec = spec
+        return self
+
+    def upsert(self):
+        return self
+
+    def replace_one(self, doc):
+        self.ops.append(dict(doc, _id=self.spec['_id']))
+
+    def execute(self):
+        self.col.round_trips += 1
+        for doc in self.ops:
+            self.col.docs[doc['_id']] = doc
+
+
+class TweepyMongodbCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        # without pymongo, fake the bson module storing the entries
+        self.fake_modules = []
+        try:
+            import bson.binary
+        except ImportError:
+            bson = types.ModuleType('bson')
+            bson.binary = types.ModuleType('bson.binary')
+            bson.binary.Binary = str
+            sys.modules['bson'] = bson
+            sys.modules['bson.binary'] = bson.binary
+            self.fake_modules = ['bson', 'bson.binary']
+        self.col = FakeMongoCollection()
+        self.cache = MongodbCache({'tweepy_cache': self.col}, timeout=60)
+
+    def tearDown(self):
+        for name in self.fake_modules:
+            del sys.modules[name]
+
+    def testlegacyindex(self):
+        col = FakeMongoCollection()
+        col.create_index('created', expireAfterSeconds=60)
+        cache = MongodbCache({'tweepy_cache': col}, timeout=60)
+        self.assertEqual(col.indexes, {'expireAt': {'expireAfterSeconds': 0}})
+
+    def testupsert(self):
+        self.cache.store('key', 'first')
+        self.cache.store('key', 'second')
+        self.assertEqual(self.cache.get('key'), 'second')
+        self.assertEqual(self.cache.count(), 1)
+        self.assertEqual(self.col.indexes, {'expireAt': {'expireAfterSeconds': 0}})
+
+    def testtimeout(self):
+        self.cache.store('key', 'value')
+        self.assertEqual(self.cache.get('key', timeout=60), 'value')
+        sleep(0.01)
+        self.assertEqual(self.cache.get('key', timeout=0.001), None)
+
+        # per entry expiration
+        self.cache.store('short', 'value', timeout=0)
+        self.assertEqual(self.cache.get('short'), None)
+        self.cache.cleanup()
+        self.assertEqual(self.cache.count(), 1)
+
+    def testbulk(self):
+        self.cache.store_many([('key%i' % i, i) for i in range(10)])
+        self.assertEqual(self.col.round_trips, 1)
+        result = self.cache.get_many(['key1', 'key5', 'missing'])
+        self.assertEqual(result, {'key1': 1, 'key5': 5})
+        self.assertEqual(self.col.round_trips, 2)
+
+        stats = self.cache.stats.snapshot()
+        self.assertEqual(stats['stores'], 10)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+
+    def testflush(self):
+        self.cache.store('key', 'value')
+        self.cache.flush()
+        self.assertEqual(self.cache.count(), 0)
+        self.assert_('expireAt' in self.col.indexes)
+
+class FakeMemcacheClient(object):
+    """In-memory stand-in for a python-memcached client"""
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def _check_key(self, key):
+        assert len(key) <= 250 and ' ' not in key, 'invalid memcache key'
+
+    def get(self, key):
+        self._check_key(key)
+        self.round_trips += 1
+        return self.data.get(key)
+
+    def get_multi(self, keys):
+        self.round_trips += 1
+        return dict([(k, self.data[k]) for k in keys if k in self.data])
+
+    def set(self, key, value, time=0):
+        self._check_key(key)
+        self.round_trips += 1
+        self.data[key] = value
+
+    def set_multi(self, mapping, time=0):
+        self.round_trips += 1
+        self.data.update(mapping)
+
+    def add(self, key, value, time=0):
+        self.data.setdefault(key, value)
+
+    def incr(self, key):
+        if key not in self.data:
+            return None
+        self.data[key] += 1
+        return self.data[key]
+
+    def get_stats(self):
+        return [('127.0.0.1:11211 (1)', {'curr_items': str(len(self.data))})]
+
+
+class TweepyMemCacheCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeMemcacheClient()
+        self.cache = MemCacheCache(self.client, timeout=60)
+
+    def testkeys(self):
+        long_key = '/1/users/lookup.json?user_id=' + ','.join(map(str, range(200)))
+        self.cache.store(long_key, 'users')
+        self.cache.store('/1/search.json?q=a b', 'results')
+        self.assertEqual(self.cache.get(long_key), 'users')
+        self.assertEqual(self.cache.get('/1/search.json?q=a b'), 'results')
+
+    def testtimeout(self):
+        self.cache.store('key', 'value')
+        self.assertEqual(self.cache.get('key', timeout=60), 'value')
+        sleep(0.01)
+        self.assertEqual(self.cache.get('key', timeout=0.001), None)
+        self.assertEqual(self.cache.stats.snapshot()['stale'], 1)
+
+    def testflush(self):
+        self.cache.store('key', 'value')
+        self.cache.flush()
+        self.assertEqual(self.cache.get('key'), None)
+        self.cache.store('key', 'new value')
+        self.assertEqual(self.cache.get('key'), 'new value')
+        self.assert_(self.cache.count() >= 1)
+        self.cache.cleanup()
+
+    def testmulti(self):
+        self.cache.store_many([('key%i' % i, i) for i in range(10)])
+        trips = self.client.round_trips
+        result = self.cache.get_many(['key1', 'key5', 'missing'])
+        self.assertEqual(result, {'key1': 1, 'key5': 5})
+        # the namespace version is known locally
+        self.assertEqual(self.client.round_trips - trips, 1)
+        trips = self.client.round_trips
+        self.cache.get('key1')
+        self.assertEqual(self.client.round_trips - trips, 1)
+
+    def testnamespacettl(self):
+        other = MemCacheCache(self.client, timeout=60, namespace_ttl=0.05)
+        self.cache.store('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        self.cache.flush()
+        self.assertEqual(self.cache.get('key'), None)
+        # the other process sees the flush once its version expires
+        self.assertEqual(other.get('key'), 'value')
+        sleep(0.06)
+        self.assertEqual(other.get('key'), None)
+
 if __name__ == '__main__':
     unittest.main()
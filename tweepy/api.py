@@ -18,7 +18,7 @@ class API(object):
             host='api.twitter.com', search_host='search.twitter.com',
              cache=None, secure=True, api_root='/1', search_root='',
             retry_count=0, retry_delay=0, timeout=30, retry_errors=None,
-            parser=None):
+            parser=None, payload_sink=None):
         self.auth = auth_handler
         self.host = host
         self.search_host = search_host
@@ -31,6 +31,8 @@ class API(object):
         self.timeout = timeout
         self.retry_errors = retry_errors
         self.parser = parser or ModelParser()
+        # called with the method and the raw body of each response
+        self.payload_sink = payload_sink
 
     """ statuses/home_timeline """
     home_timeline = bind_api(
@@ -708,7 +710,6 @@ class API(object):
         payload_type = 'search_result', payload_list = True,
         allowed_param = ['q', 'lang', 'locale', 'rpp', 'page', 'since_id', 'geocode', 'show_user', 'max_id', 'since', 'until', 'result_type']
     )
-    search.pagination_mode = 'page'
 
     """ trends/daily """
     trends_daily = bind_api(
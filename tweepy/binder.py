@@ -9,7 +9,8 @@ import re
 
 from tweepy.error import TweepError
 from tweepy.utils import convert_to_utf8_str
-from tweepy.models import Model
+from tweepy.models import Model, LazyResultSet
+from tweepy.cache import CacheKey
 
 re_path_template = re.compile('{\w+}')
 
@@ -40,6 +41,8 @@ def bind_api(**config):
             self.timeout = kargs.pop('timeout', api.timeout)
             self.retry_errors = kargs.pop('retry_errors', api.retry_errors)
             self.headers = kargs.pop('headers', {})
+            self.fields = kargs.pop('fields', None)
+            self.payload_sink = kargs.pop('payload_sink', api.payload_sink)
             self.build_parameters(args, kargs)
 
             # Pick correct URL root to use
@@ -108,10 +111,17 @@ def bind_api(**config):
             if len(self.parameters):
                 url = '%s?%s' % (url, urllib.urlencode(self.parameters))
 
+            # Results projected on some fields are cached apart,
+            # stats are grouped by the path before substitution
+            cache_key = url
+            if self.fields:
+                cache_key = '%s#fields=%r' % (url, self.fields)
+            cache_key = CacheKey(cache_key, self.api_root + APIMethod.path)
+
             # Query the cache if one is available
             # and this request uses a GET method.
             if self.use_cache and self.api.cache and self.method == 'GET':
-                cache_result = self.api.cache.get(url)
+                cache_result = self.api.cache.get(cache_key)
                 # if cache result found and not expired, return it
                 if cache_result:
                     # must restore api reference
@@ -119,6 +129,8 @@ def bind_api(**config):
                         for result in cache_result:
                             if isinstance(result, Model):
                                 result._api = self.api
+                    elif isinstance(cache_result, LazyResultSet):
+                        cache_result._api = self.api
                     else:
                         if isinstance(cache_result, Model):
                             cache_result._api = self.api
@@ -168,14 +180,19 @@ def bind_api(**config):
                     error_msg = "Twitter error response: status code = %s" % resp.status
                 raise TweepError(error_msg, resp)
 
+            # Hand the response body to the sink before parsing it
+            payload = resp.read()
+            if self.payload_sink:
+                self.payload_sink(self, payload)
+
             # Parse the response payload
-            result = self.api.parser.parse(self, resp.read())
+            result = self.api.parser.parse(self, payload)
 
             conn.close()
 
             # Store result into cache if one is available.
             if self.use_cache and self.api.cache and self.method == 'GET' and result:
-                self.api.cache.store(url, result)
+                self.api.cache.store(cache_key, result)
 
             return result
 
@@ -186,11 +203,16 @@ def bind_api(**config):
         return method.execute()
 
 
-    # Set pagination mode
-    if 'cursor' in APIMethod.allowed_param:
-        _call.pagination_mode = 'cursor'
-    elif 'page' in APIMethod.allowed_param:
-        _call.pagination_mode = 'page'
+    # Used to name the checkpoints of cursors and size their pages
+    _call.path = APIMethod.path
+    _call.allowed_param = APIMethod.allowed_param
+
+    # Set pagination modes, the first one is the default
+    _call.pagination_modes = [mode for mode, param in
+                              (('cursor', 'cursor'), ('id', 'max_id'), ('page', 'page'))
+                              if param in APIMethod.allowed_param]
+    if _call.pagination_modes:
+        _call.pagination_mode = _call.pagination_modes[0]
 
     return _call
 
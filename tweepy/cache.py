@@ -6,6 +6,10 @@ import time
 import datetime
 import threading
 import os
+import zlib
+import mmap
+import struct
+import re
 
 try:
     import cPickle as pickle
@@ -25,15 +29,209 @@ except ImportError:
     # TODO: use win32file
     pass
 
+from tweepy.utils import replace_file
+
+
+class PickleCodec(object):
+    """Serializes cache entries with pickle"""
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        """Initialize the codec
+            protocol: pickle protocol used when encoding
+        """
+        self.protocol = protocol
+
+    def encode(self, value):
+        return pickle.dumps(value, self.protocol)
+
+    def decode(self, data):
+        # pickle detects the protocol by itself, so entries
+        # written with older protocols still load.
+        return pickle.loads(data)
+
+
+class CompressedCodec(object):
+    """Compresses the output of another codec above a size threshold"""
+
+    # one byte header telling how the rest of the entry is stored
+    PLAIN = 'p'
+    COMPRESSED = 'z'
+
+    def __init__(self, codec=None, threshold=1024, level=6,
+            compress=None, decompress=None):
+        """Initialize the codec
+            codec: codec producing the serialized data [default: PickleCodec]
+            threshold: only compress data of at least this many bytes
+            level: zlib compression level
+            compress, decompress: replace zlib with another compressor
+                (ex: lz4) [optional]
+        """
+        self.codec = codec or PickleCodec()
+        self.threshold = threshold
+        self.level = level
+        self.compress = compress
+        self.decompress = decompress
+
+    def _compress(self, data):
+        if self.compress:
+            return self.compress(data)
+        return zlib.compress(data, self.level)
+
+    def _decompress(self, data):
+        if self.decompress:
+            return self.decompress(data)
+        return zlib.decompress(data)
+
+    def encode(self, value):
+        data = self.codec.encode(value)
+        if len(data) >= self.threshold:
+            compressed = self._compress(data)
+            # only keep compressed data if it actually saves space
+            if len(compressed) < len(data):
+                return self.COMPRESSED + compressed
+        return self.PLAIN + data
+
+    def decode(self, data):
+        header = data[:1]
+        if header == self.COMPRESSED:
+            return self.codec.decode(self._decompress(data[1:]))
+        if header == self.PLAIN:
+            return self.codec.decode(data[1:])
+        # written before compression was enabled
+        return self.codec.decode(data)
+
+
+class CacheKey(str):
+    """
+    Cache key of an API request (its url) which also tells the
+    endpoint it belongs to, ex: '/1/statuses/show/{id}.json'
+    """
+
+    def __new__(cls, key, endpoint=None):
+        result = str.__new__(cls, key)
+        result.endpoint = endpoint
+        return result
+
+    def __reduce__(self):
+        # pickle as a plain key
+        return (str, (str(self),))
+
+
+class CacheStats(object):
+    """Usage counters of a cache, in total and per endpoint"""
+
+    COUNTERS = ('hits', 'misses', 'stale', 'stores', 'evictions',
+                'bytes_read', 'bytes_stored', 'get_time', 'store_time')
+
+    # keys of unknown endpoints past this many are counted under OTHER
+    MAX_ENDPOINTS = 1000
+    OTHER = 'other'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def _new_counters(self):
+        return dict.fromkeys(self.COUNTERS, 0)
+
+    def _endpoint(self, key):
+        endpoint = getattr(key, 'endpoint', None)
+        if endpoint:
+            return endpoint
+        # other keys are request urls, group them by path
+        return key.split('?', 1)[0].split('#', 1)[0]
+
+    def _record(self, key, counter, count, nbytes_counter, nbytes,
+            time_counter, seconds):
+        self.lock.acquire()
+        try:
+            groups = [self._totals]
+            if key is not None:
+                endpoint = self._endpoint(key)
+                counters = self._endpoints.get(endpoint)
+                if counters is None:
+                    if len(self._endpoints) >= self.MAX_ENDPOINTS:
+                        endpoint = self.OTHER
+                        counters = self._endpoints.get(endpoint)
+                    if counters is None:
+                        counters = self._endpoints[endpoint] = self._new_counters()
+                groups.append(counters)
+            for counters in groups:
+                counters[counter] += count
+                if nbytes_counter:
+                    counters[nbytes_counter] += nbytes
+                if time_counter:
+                    counters[time_counter] += seconds
+        finally:
+            self.lock.release()
+
+    def hit(self, key, seconds=0.0, nbytes=0):
+        """Record a lookup that returned an entry"""
+        self._record(key, 'hits', 1, 'bytes_read', nbytes, 'get_time', seconds)
+
+    def miss(self, key, seconds=0.0):
+        """Record a lookup that found no entry"""
+        self._record(key, 'misses', 1, None, 0, 'get_time', seconds)
+
+    def stale(self, key, seconds=0.0, nbytes=0):
+        """Record a lookup that found an expired entry"""
+        self._record(key, 'stale', 1, 'bytes_read', nbytes, 'get_time', seconds)
+
+    def store(self, key, seconds=0.0, nbytes=0):
+        """Record a new entry being stored"""
+        self._record(key, 'stores', 1, 'bytes_stored', nbytes, 'store_time', seconds)
+
+    def evict(self, key=None, count=1):
+        """Record expired entries being deleted
+            key: entry key if known, otherwise only totals are updated
+        """
+        self._record(key, 'evictions', count, None, 0, None, 0)
+
+    def snapshot(self):
+        """Return a copy of the counters
+            The totals are at the top level, the per endpoint
+            counters are found under the 'endpoints' key.
+        """
+        self.lock.acquire()
+        try:
+            result = dict(self._totals)
+            result['endpoints'] = dict(
+                [(k, dict(v)) for k, v in self._endpoints.items()])
+            return result
+        finally:
+            self.lock.release()
+
+    def reset(self):
+        """Set all counters back to zero"""
+        self.lock.acquire()
+        try:
+            self._totals = self._new_counters()
+            self._endpoints = {}
+        finally:
+            self.lock.release()
+
 
 class Cache(object):
     """Cache interface"""
 
-    def __init__(self, timeout=60):
+    def __init__(self, timeout=60, codec=None):
         """Initialize the cache
             timeout: number of seconds to keep a cached entry
+            codec: serializes entries for backends storing bytes
+                [default: PickleCodec]
         """
         self.timeout = timeout
+        self.codec = codec or PickleCodec()
+        self.stats = CacheStats()
+
+    def _decode(self, data):
+        """Decode an entry, None if the codec can not read it
+            (ex: written with another codec), which counts as a miss
+        """
+        try:
+            return self.codec.decode(data)
+        except Exception:
+            return None
 
     def store(self, key, value):
         """Add new record to cache
@@ -62,39 +260,174 @@ class Cache(object):
         raise NotImplementedError
 
 
+class SnapshotValue(object):
+    """Cached value still living in a memory-mapped snapshot file"""
+
+    def __init__(self, data, offset, length, codec):
+        self.data = data
+        self.offset = offset
+        self.length = length
+        self.codec = codec
+
+    def load(self):
+        return self.codec.decode(self.data[self.offset:self.offset + self.length])
+
+
 class MemoryCache(Cache):
     """In-memory cache"""
 
-    def __init__(self, timeout=60):
-        Cache.__init__(self, timeout)
+    # snapshot file layout:
+    #   header: magic, version
+    #   encoded values, one after the other
+    #   index: for each entry its created time, value offset,
+    #          value length, key length followed by the key
+    #   footer: index offset, entry count, magic
+    SNAPSHOT_MAGIC = 'TWPYSNAP'
+    SNAPSHOT_VERSION = 1
+    _snapshot_header = struct.Struct('>8sB')
+    _snapshot_index = struct.Struct('>dQII')
+    _snapshot_footer = struct.Struct('>QI8s')
+
+    def __init__(self, timeout=60, codec=None):
+        """Initialize the cache
+            timeout: number of seconds to keep a cached entry
+            codec: serializes entries written to snapshots [default: PickleCodec]
+        """
+        Cache.__init__(self, timeout, codec)
         self._entries = {}
         self.lock = threading.Lock()
 
     def __getstate__(self):
         # pickle
-        return {'entries': self._entries, 'timeout': self.timeout}
+        self.lock.acquire()
+        try:
+            entries = dict([(k, self._load_entry(k, v))
+                            for k, v in self._entries.items()])
+        finally:
+            self.lock.release()
+        return {'entries': entries, 'timeout': self.timeout, 'codec': self.codec}
 
     def __setstate__(self, state):
         # unpickle
+        Cache.__init__(self, state['timeout'], state.get('codec'))
         self.lock = threading.Lock()
         self._entries = state['entries']
-        self.timeout = state['timeout']
 
     def _is_expired(self, entry, timeout):
         return timeout > 0 and (time.time() - entry[0]) >= timeout
 
+    def _load_entry(self, key, entry):
+        # decode values imported lazily from a snapshot on first use.
+        # must be called with the lock held.
+        if isinstance(entry[1], SnapshotValue):
+            entry = (entry[0], entry[1].load())
+            self._entries[key] = entry
+        return entry
+
+    def export_snapshot(self, path):
+        """Write all entries that are not expired into a snapshot file
+            path: file to write, replaced atomically once complete
+            Returns the number of entries written.
+        """
+        self.lock.acquire()
+        try:
+            entries = [(k, v) for k, v in self._entries.items()
+                       if not self._is_expired(v, self.timeout)]
+        finally:
+            self.lock.release()
+
+        tmp_path = path + '.tmp'
+        snapshot = open(tmp_path, 'wb')
+        try:
+            snapshot.write(self._snapshot_header.pack(
+                    self.SNAPSHOT_MAGIC, self.SNAPSHOT_VERSION))
+            offset = self._snapshot_header.size
+            index = []
+            for key, (created, value) in entries:
+                if isinstance(value, SnapshotValue):
+                    # still encoded, no need to decode it first
+                    data = value.data[value.offset:value.offset + value.length]
+                else:
+                    data = self.codec.encode(value)
+                snapshot.write(data)
+                if isinstance(key, unicode):
+                    key = key.encode('utf-8')
+                index.append(self._snapshot_index.pack(
+                        created, offset, len(data), len(key)) + key)
+                offset += len(data)
+            snapshot.write(''.join(index))
+            snapshot.write(self._snapshot_footer.pack(
+                    offset, len(index), self.SNAPSHOT_MAGIC))
+        finally:
+            snapshot.close()
+        replace_file(tmp_path, path)
+        return len(entries)
+
+    def import_snapshot(self, path, lazy=True):
+        """Load the entries of a snapshot file written by export_snapshot
+            Entries keep their original creation time, so they expire
+            when they would have without the restart. Entries already
+            expired or already present in the cache are skipped.
+            path: snapshot file to read
+            lazy: memory-map the file and only decode values on first
+                  access instead of decoding everything up front
+            Returns the number of entries loaded.
+        """
+        snapshot = open(path, 'rb')
+        try:
+            data = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            snapshot.close()
+
+        magic, version = self._snapshot_header.unpack_from(data, 0)
+        index_offset, count, end_magic = self._snapshot_footer.unpack_from(
+                data, len(data) - self._snapshot_footer.size)
+        if magic != self.SNAPSHOT_MAGIC or end_magic != self.SNAPSHOT_MAGIC:
+            raise ValueError('%s is not a cache snapshot' % path)
+        if version != self.SNAPSHOT_VERSION:
+            raise ValueError('Unsupported cache snapshot version: %s' % version)
+
+        loaded = 0
+        position = index_offset
+        self.lock.acquire()
+        try:
+            for i in xrange(count):
+                created, offset, length, key_length = \
+                        self._snapshot_index.unpack_from(data, position)
+                position += self._snapshot_index.size
+                key = data[position:position + key_length]
+                position += key_length
+
+                if key in self._entries or \
+                        self._is_expired((created, None), self.timeout):
+                    continue
+                value = SnapshotValue(data, offset, length, self.codec)
+                if not lazy:
+                    value = value.load()
+                self._entries[key] = (created, value)
+                loaded += 1
+        finally:
+            self.lock.release()
+        if not lazy:
+            data.close()
+        return loaded
+
     def store(self, key, value):
+        start = time.time()
         self.lock.acquire()
         self._entries[key] = (time.time(), value)
         self.lock.release()
+        self.stats.store(key, time.time() - start)
 
     def get(self, key, timeout=None):
+        start = time.time()
         self.lock.acquire()
         try:
             # check to see if we have this key
             entry = self._entries.get(key)
             if not entry:
                 # no hit, return nothing
+                self.stats.miss(key, time.time() - start)
                 return None
 
             # use provided timeout in arguments if provided
@@ -106,9 +439,13 @@ class MemoryCache(Cache):
             if self._is_expired(entry, timeout):
                 # entry expired, delete and return nothing
                 del self._entries[key]
+                self.stats.stale(key, time.time() - start)
+                self.stats.evict(key)
                 return None
 
             # entry found and not expired, return it
+            entry = self._load_entry(key, entry)
+            self.stats.hit(key, time.time() - start)
             return entry[1]
         finally:
             self.lock.release()
@@ -122,6 +459,7 @@ class MemoryCache(Cache):
             for k, v in self._entries.items():
                 if self._is_expired(v, self.timeout):
                     del self._entries[k]
+                    self.stats.evict(k)
         finally:
             self.lock.release()
 
@@ -137,8 +475,8 @@ class FileCache(Cache):
     # locks used to make cache thread-safe
     cache_locks = {}
 
-    def __init__(self, cache_dir, timeout=60):
-        Cache.__init__(self, timeout)
+    def __init__(self, cache_dir, timeout=60, codec=None):
+        Cache.__init__(self, timeout, codec)
         if os.path.exists(cache_dir) is False:
             os.mkdir(cache_dir)
         self.cache_dir = cache_dir
@@ -200,6 +538,7 @@ class FileCache(Cache):
             os.remove(path + '.lock')
 
     def store(self, key, value):
+        start = time.time()
         path = self._get_path(key)
         self.lock.acquire()
         try:
@@ -208,42 +547,65 @@ class FileCache(Cache):
             datafile = open(path, 'wb')
 
             # write data
-            pickle.dump((time.time(), value), datafile)
+            data = self.codec.encode((time.time(), value))
+            datafile.write(data)
 
             # close and unlock file
             datafile.close()
             self._unlock_file(f_lock)
         finally:
             self.lock.release()
+        self.stats.store(key, time.time() - start, len(data))
 
     def get(self, key, timeout=None):
-        return self._get(self._get_path(key), timeout)
+        start = time.time()
+        value, nbytes, expired = self._get(self._get_path(key), timeout)
+        if expired:
+            self.stats.stale(key, time.time() - start, nbytes)
+            self.stats.evict(key)
+        elif nbytes:
+            self.stats.hit(key, time.time() - start, nbytes)
+        else:
+            self.stats.miss(key, time.time() - start)
+        return value
 
     def _get(self, path, timeout):
+        """Read an entry file
+            Returns the value, the number of bytes read and whether
+            the entry was expired (and deleted).
+        """
         if os.path.exists(path) is False:
             # no record
-            return None
+            return None, 0, False
         self.lock.acquire()
         try:
             # acquire lock and open
             f_lock = self._lock_file(path, False)
             datafile = open(path, 'rb')
 
-            # read pickled object
-            created_time, value = pickle.load(datafile)
+            # read serialized object
+            data = datafile.read()
+            entry = self._decode(data)
             datafile.close()
+            if entry is None:
+                # unreadable, drop it
+                self._delete_file(path)
+                self._unlock_file(f_lock)
+                return None, 0, False
+            created_time, value = entry
 
             # check if value is expired
             if timeout is None:
                 timeout = self.timeout
-            if timeout > 0 and (time.time() - created_time) >= timeout:
+            expired = timeout > 0 and (time.time() - created_time) >= timeout
+            if expired:
                 # expired! delete from cache
                 value = None
                 self._delete_file(path)
 
             # unlock and return result
             self._unlock_file(f_lock)
-            return value
+            return value, len(data), expired
         finally:
             self.lock.release()
 
@@ -259,7 +621,8 @@ class FileCache(Cache):
         for entry in os.listdir(self.cache_dir):
             if entry.endswith('.lock'):
                 continue
-            self._get(os.path.join(self.cache_dir, entry), None)
+            if self._get(os.path.join(self.cache_dir, entry), None)[2]:
+                self.stats.evict()
 
     def flush(self):
         for entry in os.listdir(self.cache_dir):
@@ -268,47 +631,170 @@ class FileCache(Cache):
             self._delete_file(os.path.join(self.cache_dir, entry))
 
 class MemCacheCache(Cache):
-    """Cache interface"""
+    """Cache running in memcached servers"""
+
+    # memcached refuses longer keys, or keys containing
+    # whitespace or control characters.
+    MAX_KEY_LENGTH = 250
+    _invalid_key_chars = re.compile(r'[\x00-\x20\x7f]')
 
-    def __init__(self, client, timeout=60):
+    def __init__(self, client, timeout=60, prefix='tweepy', codec=None,
+            namespace_ttl=5):
         """Initialize the cache
             client: The memcache client
             timeout: number of seconds to keep a cached entry
+            prefix: prepended to every key stored by this cache
+            codec: serializes entries [default: PickleCodec]
+            namespace_ttl: seconds the namespace version is kept locally,
+                so a flush() by another process is seen after at most
+                this long (0 to read it on every call)
         """
+        Cache.__init__(self, timeout, codec)
         self.client = client
-        self.timeout = timeout
+        self.prefix = prefix
+        self.namespace_ttl = namespace_ttl
+        self._namespace_key = '%s:namespace' % prefix
+        # (version, time it must be read again)
+        self._local_namespace = (None, 0)
+
+    def _namespace(self):
+        """Return the current namespace version
+            Every key embeds it, so bumping the version
+            makes all previous entries unreachable.
+        """
+        version, expires = self._local_namespace
+        if version is not None and time.time() < expires:
+            return version
+        version = self.client.get(self._namespace_key)
+        if version is None:
+            # start from the clock, so versions used before the
+            # counter itself got evicted are not reused.
+            self.client.add(self._namespace_key, int(time.time()))
+            version = self.client.get(self._namespace_key)
+        self._local_namespace = (version, time.time() + self.namespace_ttl)
+        return version
+
+    def _make_key(self, key, namespace):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        full_key = '%s:%s:%s' % (self.prefix, namespace, key)
+        if len(full_key) > self.MAX_KEY_LENGTH or \
+                self._invalid_key_chars.search(full_key):
+            full_key = '%s:%s:md5:%s' % (self.prefix, namespace,
+                                         hashlib.md5(key).hexdigest())
+        return full_key
+
+    def _is_expired(self, entry, timeout):
+        if timeout is None:
+            timeout = self.timeout
+        return timeout > 0 and (time.time() - entry[0]) >= timeout
+
+    def _load(self, key, data, timeout, seconds):
+        entry = None
+        if data is not None:
+            entry = self._decode(data)
+        if entry is None:
+            self.stats.miss(key, seconds)
+            return None
+        if self._is_expired(entry, timeout):
+            # memcached drops it by itself once the stored timeout is over
+            self.stats.stale(key, seconds, len(data))
+            return None
+        self.stats.hit(key, seconds, len(data))
+        return entry[1]
 
     def store(self, key, value):
         """Add new record to cache
             key: entry key
             value: data of entry
         """
-        self.client.set(key, value, time=self.timeout)
+        start = time.time()
+        data = self.codec.encode((time.time(), value))
+        self.client.set(self._make_key(key, self._namespace()), data, time=self.timeout)
+        self.stats.store(key, time.time() - start, len(data))
+
+    def store_many(self, items):
+        """Add several records to cache in a single round-trip
+            items: list of (key, value) pairs
+        """
+        if not items:
+            return
+        start = time.time()
+        namespace = self._namespace()
+        mapping = {}
+        sizes = []
+        for key, value in items:
+            data = self.codec.encode((time.time(), value))
+            mapping[self._make_key(key, namespace)] = data
+            sizes.append((key, len(data)))
+        self.client.set_multi(mapping, time=self.timeout)
+        elapsed = (time.time() - start) / len(sizes)
+        for key, size in sizes:
+            self.stats.store(key, elapsed, size)
 
     def get(self, key, timeout=None):
         """Get cached entry if exists and not expired
             key: which entry to get
-            timeout: override timeout with this value [optional]. DOES NOT WORK HERE
+            timeout: override timeout with this value [optional].
+                Entries never outlive the timeout used when storing them.
         """
-        return self.client.get(key)
+        start = time.time()
+        data = self.client.get(self._make_key(key, self._namespace()))
+        return self._load(key, data, timeout, time.time() - start)
+
+    def get_many(self, keys, timeout=None):
+        """Get several cached entries in a single round-trip
+            keys: which entries to get
+            timeout: override timeout with this value [optional]
+            Returns a dict of the entries found and not expired.
+        """
+        if not keys:
+            return {}
+        start = time.time()
+        namespace = self._namespace()
+        full_keys = dict([(key, self._make_key(key, namespace)) for key in keys])
+        found = self.client.get_multi(full_keys.values())
+        elapsed = (time.time() - start) / len(keys)
+
+        results = {}
+        for key in keys:
+            value = self._load(key, found.get(full_keys[key]), timeout, elapsed)
+            if value is not None:
+                results[key] = value
+        return results
 
     def count(self):
-        """Get count of entries currently stored in cache. RETURN 0"""
-        raise NotImplementedError
+        """Get an estimate of the entries currently stored in cache
+            memcached only reports the number of items in each server,
+            which includes entries of other applications and entries
+            made unreachable by flush() that were not evicted yet.
+        """
+        count = 0
+        for server, stats in self.client.get_stats():
+            count += int(stats.get('curr_items', 0))
+        return count
 
     def cleanup(self):
-        """Delete any expired entries in cache. NO-OP"""
-        raise NotImplementedError
+        """Delete any expired entries in cache.
+        NO-OP, memcached expires entries by itself."""
+        pass
 
     def flush(self):
-        """Delete all cached entries. NO-OP"""
-        raise NotImplementedError
+        """Delete all cached entries
+            Bumps the namespace version instead of deleting entries one
+            by one, memcached evicts the old ones when it needs space.
+        """
+        version = self.client.incr(self._namespace_key)
+        if version is None:
+            version = int(time.time())
+            self.client.set(self._namespace_key, version)
+        self._local_namespace = (version, time.time() + self.namespace_ttl)
 
 class RedisCache(Cache):
     '''Cache running in a redis server'''
 
-    def __init__(self, client, timeout=60, keys_container = 'tweepy:keys', pre_identifier = 'tweepy:'):
-        Cache.__init__(self, timeout)
+    def __init__(self, client, timeout=60, keys_container = 'tweepy:keys', pre_identifier = 'tweepy:', codec=None):
+        Cache.__init__(self, timeout, codec)
         self.client = client
         self.keys_container = keys_container
         self.pre_identifier = pre_identifier
@@ -319,29 +805,36 @@ class RedisCache(Cache):
 
     def store(self, key, value):
         '''Store the key, value pair in our redis server'''
+        start = time.time()
+        stats_key = key
         # Prepend tweepy to our key, this makes it easier to identify tweepy keys in our redis server
         key = self.pre_identifier + key
         # Get a pipe (to execute several redis commands in one step)
         pipe = self.client.pipeline()
         # Set our values in a redis hash (similar to python dict)
-        pipe.set(key, pickle.dumps((time.time(), value)))
+        data = self.codec.encode((time.time(), value))
+        pipe.set(key, data)
         # Set the expiration
         pipe.expire(key, self.timeout)
         # Add the key to a set containing all the keys
         pipe.sadd(self.keys_container, key)
         # Execute the instructions in the redis server
         pipe.execute()
+        self.stats.store(stats_key, time.time() - start, len(data))
 
     def get(self, key, timeout=None):
         '''Given a key, returns an element from the redis table'''
+        start = time.time()
+        stats_key = key
         key = self.pre_identifier + key
         # Check to see if we have this key
         unpickled_entry = self.client.get(key)
-        if not unpickled_entry:
-            # No hit, return nothing
+        entry = unpickled_entry and self._decode(unpickled_entry)
+        if not entry:
+            # No hit (or an unreadable entry), return nothing
+            self.stats.miss(stats_key, time.time() - start)
             return None
 
-        entry = pickle.loads(unpickled_entry)
         # Use provided timeout in arguments if provided
         # otherwise use the one provided during init.
         if timeout is None:
@@ -351,8 +844,11 @@ class RedisCache(Cache):
         if self._is_expired(entry, timeout):
             # entry expired, delete and return nothing
             self.delete_entry(key)
+            self.stats.stale(stats_key, time.time() - start, len(unpickled_entry))
+            self.stats.evict(stats_key)
             return None
         # entry found and not expired, return it
+        self.stats.hit(stats_key, time.time() - start, len(unpickled_entry))
         return entry[1]
 
     def count(self):
@@ -373,9 +869,10 @@ class RedisCache(Cache):
         for key in keys:
             entry = self.client.get(key)
             if entry:
-                entry = pickle.loads(entry)
-                if self._is_expired(entry, self.timeout):
+                entry = self._decode(entry)
+                if entry is None or self._is_expired(entry, self.timeout):
                     self.delete_entry(key)
+                    self.stats.evict(key[len(self.pre_identifier):])
 
     def flush(self):
         '''Delete all entries from the cache'''
@@ -387,27 +884,114 @@ class RedisCache(Cache):
 class MongodbCache(Cache):
     """A simple pickle-based MongoDB cache sytem."""
 
-    def __init__(self, db, timeout=3600, collection='tweepy_cache'):
-        """Should receive a "database" cursor from pymongo."""
-        Cache.__init__(self, timeout)
-        self.timeout = timeout
+    def __init__(self, db, timeout=3600, collection='tweepy_cache', codec=None):
+        """Should receive a "database" cursor from pymongo.
+            Each entry carries its own expiration date in the 'expireAt'
+            field, so MongoDB removes it without an index-wide TTL.
+        """
+        Cache.__init__(self, timeout, codec)
         self.col = db[collection]
-        self.col.create_index('created', expireAfterSeconds=timeout)
+        self._create_indexes()
 
-    def store(self, key, value):
+    def _create_indexes(self):
+        # the TTL index of older versions would keep deleting
+        # every entry once the global timeout has passed
+        legacy = self.col.index_information().get('created_1')
+        if legacy and 'expireAfterSeconds' in legacy:
+            self.col.drop_index('created_1')
+        self.col.create_index('expireAt', expireAfterSeconds=0)
+
+    def _document(self, value, timeout):
         from bson.binary import Binary
 
+        if timeout is None:
+            timeout = self.timeout
+        now = datetime.datetime.utcnow()
+        return {
+            'created': now,
+            'expireAt': now + datetime.timedelta(seconds=timeout),
+            'value': Binary(self.codec.encode(value))
+        }
+
+    def _is_expired(self, obj, timeout):
+        # MongoDB only deletes expired documents once a minute,
+        # so they can still be read for a while after expiring.
         now = datetime.datetime.utcnow()
-        blob = Binary(pickle.dumps(value))
+        if timeout:
+            return now - obj['created'] >= datetime.timedelta(seconds=timeout)
+        return obj['expireAt'] <= now
+
+    # only fetch the fields needed to decide if an entry is usable
+    _projection = {'value': True, 'created': True, 'expireAt': True}
 
-        self.col.insert({'created': now, '_id': key, 'value': blob})
+    def store(self, key, value, timeout=None):
+        """Add new record to cache, replacing any existing one
+            key: entry key
+            value: data of entry
+            timeout: override timeout for this entry [optional]
+        """
+        start = time.time()
+        doc = self._document(value, timeout)
+        self.col.update({'_id': key}, doc, upsert=True)
+        self.stats.store(key, time.time() - start, len(doc['value']))
+
+    def store_many(self, items, timeout=None):
+        """Add or replace several records in a single round-trip
+            items: list of (key, value) pairs
+            timeout: override timeout for these entries [optional]
+        """
+        if not items:
+            return
+        start = time.time()
+        bulk = self.col.initialize_unordered_bulk_op()
+        sizes = []
+        for key, value in items:
+            doc = self._document(value, timeout)
+            bulk.find({'_id': key}).upsert().replace_one(doc)
+            sizes.append((key, len(doc['value'])))
+        bulk.execute()
+        elapsed = (time.time() - start) / len(sizes)
+        for key, size in sizes:
+            self.stats.store(key, elapsed, size)
+
+    def _load(self, key, obj, timeout, seconds):
+        value = None
+        if obj is not None:
+            value = self._decode(obj['value'])
+        if value is None:
+            self.stats.miss(key, seconds)
+            return None
+        if self._is_expired(obj, timeout):
+            self.stats.stale(key, seconds, len(obj['value']))
+            return None
+        self.stats.hit(key, seconds, len(obj['value']))
+        return value
 
     def get(self, key, timeout=None):
-        if timeout:
-            raise NotImplementedError
-        obj = self.col.find_one({'_id': key})
-        if obj:
-            return pickle.loads(obj['value'])
+        start = time.time()
+        obj = self.col.find_one({'_id': key}, self._projection)
+        return self._load(key, obj, timeout, time.time() - start)
+
+    def get_many(self, keys, timeout=None):
+        """Get several cached entries in a single round-trip
+            keys: which entries to get
+            timeout: override timeout with this value [optional]
+            Returns a dict of the entries found and not expired.
+        """
+        if not keys:
+            return {}
+        start = time.time()
+        found = {}
+        for obj in self.col.find({'_id': {'$in': list(keys)}}, self._projection):
+            found[obj['_id']] = obj
+        elapsed = (time.time() - start) / len(keys)
+
+        results = {}
+        for key in keys:
+            value = self._load(key, found.get(key), timeout, elapsed)
+            if value is not None:
+                results[key] = value
+        return results
 
     def count(self):
         return self.col.find({}).count()
@@ -416,9 +1000,12 @@ class MongodbCache(Cache):
         return self.col.remove({'_id': key})
 
     def cleanup(self):
-        """MongoDB will automatically clear expired keys."""
-        pass
+        """MongoDB will automatically clear expired keys, this
+        only removes the ones its TTL monitor has not reached yet."""
+        result = self.col.remove({'expireAt': {'$lte': datetime.datetime.utcnow()}})
+        if isinstance(result, dict) and result.get('n'):
+            self.stats.evict(count=result['n'])
 
     def flush(self):
         self.col.drop()
-        self.col.create_index('created', expireAfterSeconds=self.timeout)
+        self._create_indexes()
@@ -0,0 +1,95 @@
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+import os
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from tweepy.utils import replace_file
+
+
+class CheckpointStore(object):
+    """Keeps the checkpoints of cursors, see Cursor(checkpoint=...)"""
+
+    def save(self, token, state):
+        """Save the state of a cursor under token"""
+        raise NotImplementedError
+
+    def load(self, token):
+        """Return the state saved under token, or None"""
+        raise NotImplementedError
+
+    def delete(self, token):
+        """Forget the state saved under token"""
+        raise NotImplementedError
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Stores each checkpoint in a file of a directory"""
+
+    def __init__(self, directory):
+        if os.path.exists(directory) is False:
+            os.mkdir(directory)
+        self.directory = directory
+
+    def _get_path(self, token):
+        md5 = hashlib.md5()
+        md5.update(token)
+        return os.path.join(self.directory, md5.hexdigest() + '.checkpoint')
+
+    def save(self, token, state):
+        path = self._get_path(token)
+        # write a new file then rename it, so a crash while
+        # saving leaves the previous checkpoint intact
+        temp_path = path + '.tmp'
+        f = open(temp_path, 'wb')
+        try:
+            pickle.dump((token, state), f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        replace_file(temp_path, path)
+
+    def load(self, token):
+        try:
+            f = open(self._get_path(token), 'rb')
+        except IOError:
+            return None
+        try:
+            saved_token, state = pickle.load(f)
+        finally:
+            f.close()
+        if saved_token != token:
+            return None
+        return state
+
+    def delete(self, token):
+        try:
+            os.remove(self._get_path(token))
+        except OSError:
+            pass
+
+
+class CacheCheckpointStore(CheckpointStore):
+    """
+    Stores checkpoints in a tweepy Cache. They expire
+    with the timeout of the cache unless one is given.
+    """
+
+    def __init__(self, cache, prefix='tweepy:checkpoint:', timeout=None):
+        self.cache = cache
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def save(self, token, state):
+        self.cache.store(self.prefix + token, state)
+
+    def load(self, token):
+        return self.cache.get(self.prefix + token, self.timeout)
+
+    def delete(self, token):
+        # not every cache can delete a single key
+        self.cache.store(self.prefix + token, None)
@@ -0,0 +1,152 @@
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+"""
+Export of result sets as typed columns for analytics.
+"""
+
+import calendar
+from array import array
+from datetime import datetime
+
+from tweepy.utils import parse_datetime, parse_search_datetime, INT64_TYPECODE
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _epoch(date):
+    return calendar.timegm(date.utctimetuple())
+
+
+def _parse_timestamp(string):
+    try:
+        return parse_datetime(string)
+    except ValueError:
+        return parse_search_datetime(string)
+
+
+def _json_getter(path):
+    """Return a function reading a dotted field from a decoded JSON object"""
+    keys = path.split('.')
+    parse_dates = keys[-1] == 'created_at'
+
+    def get(obj):
+        for key in keys:
+            if obj is None:
+                return None
+            obj = obj.get(key)
+        if parse_dates and isinstance(obj, basestring):
+            return _epoch(_parse_timestamp(obj))
+        return obj
+    return get
+
+
+def _model_getter(path):
+    """Return a function reading a dotted attribute from a model"""
+    names = path.split('.')
+
+    def get(obj):
+        for name in names:
+            if obj is None:
+                return None
+            obj = getattr(obj, name, None)
+        if isinstance(obj, datetime):
+            return _epoch(obj)
+        return obj
+    return get
+
+
+def _column_kind(values):
+    kind = None
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value_kind = 'bool'
+        elif isinstance(value, (int, long)):
+            value_kind = 'int'
+        elif isinstance(value, float):
+            value_kind = 'float'
+        else:
+            return 'object'
+        if kind is None or kind == 'bool' or (kind == 'int' and value_kind == 'float'):
+            kind = value_kind
+        elif value_kind == 'float' or (kind == 'float' and value_kind == 'int'):
+            kind = 'float'
+    return kind or 'object'
+
+
+def _make_column(values, use_numpy, missing):
+    kind = _column_kind(values)
+    if kind != 'object':
+        values = [missing if v is None else v for v in values]
+    if use_numpy:
+        dtype = {'bool': numpy.bool_, 'int': numpy.int64,
+                 'float': numpy.float64, 'object': object}[kind]
+        return numpy.array(values, dtype=dtype)
+    typecode = {'bool': 'b', 'int': INT64_TYPECODE, 'float': 'd'}.get(kind)
+    if typecode is None:
+        # strings and nested objects, or no 64 bit integer arrays
+        return values
+    return array(typecode, values)
+
+
+class ColumnBuilder(object):
+    """
+    Collects the values of some fields over many pages of results
+    and returns them as typed columns.
+
+    Pages may be result sets of models or lists of decoded JSON
+    objects (ex: from an API using JSONParser). Lazy result sets are
+    read from their JSON objects, without building any model.
+    Dotted fields (ex: 'user.followers_count') read nested values and
+    created_at timestamps become seconds since the epoch.
+    """
+
+    def __init__(self, fields, use_numpy=None, missing=0):
+        """
+        fields: names of the fields to export
+        use_numpy: build NumPy arrays instead of stdlib arrays,
+                   by default whenever NumPy is installed
+        missing: value stored for missing numbers
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        self.fields = list(fields)
+        self.use_numpy = use_numpy
+        self.missing = missing
+        self._values = dict([(field, []) for field in self.fields])
+        self._json_getters = [(f, _json_getter(f)) for f in self.fields]
+        self._model_getters = [(f, _model_getter(f)) for f in self.fields]
+
+    def add(self, items):
+        """Add the values of a page of results"""
+        # avoid the circular import with models
+        from tweepy.models import LazyResultSet
+        if isinstance(items, LazyResultSet):
+            items = items._items
+        items = [item for item in items if item is not None]
+        if not items:
+            return
+        if isinstance(items[0], dict):
+            getters = self._json_getters
+        else:
+            getters = self._model_getters
+        for field, get in getters:
+            self._values[field].extend([get(item) for item in items])
+
+    def columns(self):
+        """Return a dict of field name to column"""
+        return dict([(field, _make_column(values, self.use_numpy, self.missing))
+                     for field, values in self._values.items()])
+
+
+def to_columns(items, fields, use_numpy=None, missing=0):
+    """Return the given fields of a page of results as typed columns"""
+    builder = ColumnBuilder(fields, use_numpy, missing)
+    builder.add(items)
+    return builder.columns()
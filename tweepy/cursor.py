@@ -2,19 +2,68 @@
 # Copyright 2009-2010 Joshua Roesslein
 # See LICENSE for details.
 
+import sys
+import hashlib
+import threading
+from collections import deque
+from Queue import Queue, Empty, Full
+
 from tweepy.error import TweepError
+from tweepy.models import LazyResultSet
 
 class Cursor(object):
     """Pagination helper class"""
 
     def __init__(self, method, *args, **kargs):
+        """
+        mode: 'cursor', 'id' or 'page', overrides the default
+              pagination mode of methods supporting several
+              (ex: timelines page by id unless told otherwise)
+        prefetch: number of pages fetched in the background
+                  ahead of the one being consumed (0 to disable)
+        parallel: number of pages fetched concurrently by page mode
+                  methods, see ParallelPageIterator (0 to disable).
+                  Selects page mode if the method supports it.
+        checkpoint: tweepy.checkpoint.CheckpointStore saving the
+                    position of the cursor, see resume
+        checkpoint_every: save the position every this many pages
+        checkpoint_token: name of the checkpoint, by default derived
+                          from the method and its arguments
+        """
+        mode = kargs.pop('mode', None)
+        prefetch = kargs.pop('prefetch', 0)
+        parallel = kargs.pop('parallel', 0)
+        store = kargs.pop('checkpoint', None)
+        checkpoint_every = kargs.pop('checkpoint_every', 1)
+        token = kargs.pop('checkpoint_token', None)
+        if store is not None and token is None:
+            token = checkpoint_token(method, args, kargs)
         if hasattr(method, 'pagination_mode'):
-            if method.pagination_mode == 'cursor':
+            modes = getattr(method, 'pagination_modes', [method.pagination_mode])
+            if mode is None:
+                if parallel and 'page' in modes:
+                    mode = 'page'
+                else:
+                    mode = method.pagination_mode
+            elif mode not in modes:
+                raise TweepError('This method does not support %s pagination' % mode)
+            if parallel and mode != 'page':
+                raise TweepError('Only page mode methods can fetch pages in parallel')
+            if mode == 'cursor':
                 self.iterator = CursorIterator(method, args, kargs)
+            elif mode == 'id':
+                self.iterator = IdIterator(method, args, kargs)
+            elif parallel:
+                self.iterator = ParallelPageIterator(method, args, kargs, parallel)
             else:
                 self.iterator = PageIterator(method, args, kargs)
         else:
             raise TweepError('This method does not perform pagination')
+        if prefetch > 0:
+            self.iterator = PrefetchIterator(self.iterator, prefetch)
+        if store is not None:
+            self.iterator = CheckpointIterator(self.iterator, store, token,
+                                               checkpoint_every)
 
     def pages(self, limit=0):
         """Return iterator for pages"""
@@ -22,12 +71,46 @@ class Cursor(object):
             self.iterator.limit = limit
         return self.iterator
 
-    def items(self, limit=0):
-        """Return iterator for items in each page"""
+    def items(self, limit=0, dedupe=False, window=1000):
+        """
+        Return iterator for items in each page
+        dedupe: skip the items already returned among the
+                last window ones, ex: when page mode timelines
+                shift as new items arrive
+        """
         i = ItemIterator(self.iterator)
         i.limit = limit
+        if dedupe:
+            i.dedupe(window)
+        if isinstance(self.iterator, CheckpointIterator):
+            self.iterator.item_iterator = i
+            i.skip = self.iterator.skip
         return i
 
+    def checkpoint(self):
+        """Save the current position and return its token"""
+        if not isinstance(self.iterator, CheckpointIterator):
+            raise TweepError('This cursor has no checkpoint store')
+        return self.iterator.checkpoint()
+
+    def resume(self, token=None):
+        """
+        Continue from the position saved under token, by default
+        the token of this cursor. Starts from the beginning if no
+        position was saved. Returns the cursor.
+        """
+        if not isinstance(self.iterator, CheckpointIterator):
+            raise TweepError('This cursor has no checkpoint store')
+        self.iterator.resume(token)
+        return self
+
+def checkpoint_token(method, args, kargs):
+    """Return a checkpoint token identifying the pages of a method call"""
+    name = getattr(method, 'path', None) or getattr(method, '__name__', '')
+    md5 = hashlib.md5()
+    md5.update(repr((name, args, sorted(kargs.items()))))
+    return md5.hexdigest()
+
 class BaseIterator(object):
 
     def __init__(self, method, args, kargs):
@@ -42,6 +125,17 @@ class BaseIterator(object):
     def prev(self):
         raise NotImplementedError
 
+    def get_state(self):
+        """Return the position after the last page returned"""
+        raise TweepError('This iterator can not save its position')
+
+    def set_state(self, state, rewind=False):
+        """
+        Move to a position returned by get_state.
+        rewind: return the last page of that position again
+        """
+        raise TweepError('This iterator can not restore its position')
+
     def __iter__(self):
         return self
 
@@ -51,6 +145,7 @@ class CursorIterator(BaseIterator):
         BaseIterator.__init__(self, method, args, kargs)
         self.next_cursor = -1
         self.prev_cursor = 0
+        self.current_cursor = None
         self.count = 0
         # If a cursor is provided, start from that point
         if kargs.get('cursor'):
@@ -59,12 +154,14 @@ class CursorIterator(BaseIterator):
     def next(self):
         if self.next_cursor == 0 or (self.limit and self.count == self.limit):
             raise StopIteration
+        cursor = self.next_cursor
         data, cursors = self.method(
-                cursor=self.next_cursor, *self.args, **self.kargs
+                cursor=cursor, *self.args, **self.kargs
         )
         self.prev_cursor, self.next_cursor = cursors
         if len(data) == 0:
             raise StopIteration
+        self.current_cursor = cursor
         self.count += 1
         return data
 
@@ -78,6 +175,103 @@ class CursorIterator(BaseIterator):
         self.count -= 1
         return data
 
+    def get_state(self):
+        return {'cursor': self.current_cursor, 'next_cursor': self.next_cursor,
+                'prev_cursor': self.prev_cursor, 'count': self.count}
+
+    def set_state(self, state, rewind=False):
+        self.current_cursor = state['cursor']
+        self.next_cursor = state['next_cursor']
+        self.prev_cursor = state['prev_cursor']
+        self.count = state['count']
+        if rewind:
+            self.next_cursor = self.current_cursor
+            self.count -= 1
+
+# largest page size accepted by the parameter of each kind of timeline
+ID_PAGE_SIZES = [('count', 200), ('per_page', 200), ('rpp', 100)]
+
+def _item_id(item):
+    try:
+        return item.id
+    except AttributeError:
+        return item['id']
+
+def _page_ids(page):
+    # lazy result sets are read without parsing their items
+    if isinstance(page, LazyResultSet):
+        return [item['id'] for item in page._items]
+    return [_item_id(item) for item in page]
+
+class IdIterator(BaseIterator):
+    """
+    Walks a timeline backwards from its newest items, asking for the
+    page below the oldest item seen with max_id, and with the largest
+    page size the method allows. Unlike page numbers, this does not
+    shift as new items arrive.
+    Iteration ends on an empty page or on reaching since_id.
+    """
+
+    def __init__(self, method, args, kargs):
+        BaseIterator.__init__(self, method, args, kargs)
+        self.max_id = kargs.pop('max_id', None)
+        self.since_id = kargs.pop('since_id', None)
+        if self.since_id is not None:
+            self.since_id = long(self.since_id)
+        allowed_param = getattr(method, 'allowed_param', [])
+        for name, size in ID_PAGE_SIZES:
+            if name in allowed_param:
+                kargs.setdefault(name, size)
+                break
+        self.count = 0
+        # max_id of each page returned, to page back
+        self.history = []
+        self.done = False
+
+    def _fetch(self, max_id):
+        kargs = dict(self.kargs)
+        if max_id is not None:
+            kargs['max_id'] = max_id
+        if self.since_id is not None:
+            kargs['since_id'] = self.since_id
+        return self.method(*self.args, **kargs)
+
+    def next(self):
+        if self.done or (self.limit and self.count == self.limit):
+            raise StopIteration
+        data = self._fetch(self.max_id)
+        if len(data) == 0:
+            self.done = True
+            raise StopIteration
+        self.history.append(self.max_id)
+        self.max_id = min(_page_ids(data)) - 1
+        if self.since_id is not None and self.max_id <= self.since_id:
+            self.done = True
+        self.count += 1
+        return data
+
+    def prev(self):
+        if len(self.history) < 2:
+            raise TweepError('Can not page back more, at first page')
+        self.max_id = self.history.pop()
+        self.done = False
+        self.count -= 1
+        return self._fetch(self.history[-1])
+
+    def get_state(self):
+        return {'max_id': self.max_id, 'history': list(self.history),
+                'count': self.count, 'done': self.done}
+
+    def set_state(self, state, rewind=False):
+        self.max_id = state['max_id']
+        self.history = list(state['history'])
+        self.count = state['count']
+        self.done = state['done']
+        if rewind:
+            self.max_id = self.history.pop()
+            self.count -= 1
+            self.done = False
+
 class PageIterator(BaseIterator):
 
     def __init__(self, method, args, kargs):
@@ -97,6 +291,196 @@ class PageIterator(BaseIterator):
         self.current_page -= 1
         return self.method(page=self.current_page, *self.args, **self.kargs)
 
+    def get_state(self):
+        return {'page': self.current_page}
+
+    def set_state(self, state, rewind=False):
+        self.current_page = state['page']
+        if rewind:
+            self.current_page -= 1
+
+class ParallelPageIterator(PageIterator):
+    """
+    Page iterator fetching a window of pages concurrently, one
+    thread per page, and returning them in order.
+
+    Iteration ends after an empty page, or a page shorter than the
+    count, per_page or rpp parameter when one is given (without it,
+    short pages are common, ex: timelines filtering out retweets).
+    Pages fetched beyond the end are dropped and no page past it is
+    requested.
+    """
+
+    def __init__(self, method, args, kargs, window=4):
+        PageIterator.__init__(self, method, args, kargs)
+        self.window = window
+        self.page_size = None
+        for name in ('count', 'per_page', 'rpp'):
+            if kargs.get(name):
+                self.page_size = int(kargs[name])
+                break
+        self.last_page = None
+        self.next_fetch = 1
+        self.results = {}
+        self.condition = threading.Condition()
+
+    def _reset_window(self):
+        # fetch again from the page after the current one
+        self.condition.acquire()
+        try:
+            self.next_fetch = self.current_page + 1
+            self.last_page = None
+            self.results = {}
+        finally:
+            self.condition.release()
+
+    def set_state(self, state, rewind=False):
+        PageIterator.set_state(self, state, rewind)
+        self._reset_window()
+
+    def prev(self):
+        items = PageIterator.prev(self)
+        self._reset_window()
+        return items
+
+    def _fetch(self, page):
+        try:
+            result = ('page', self.method(page=page, *self.args, **self.kargs))
+        except Exception:
+            result = ('error', sys.exc_info())
+        self.condition.acquire()
+        try:
+            if self.last_page is None or page <= self.last_page:
+                self.results[page] = result
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def _end(self, page):
+        self.condition.acquire()
+        try:
+            self.last_page = page
+            for p in self.results.keys():
+                if p > page:
+                    del self.results[p]
+        finally:
+            self.condition.release()
+
+    def _fill_window(self):
+        last = self.current_page + self.window - 1
+        if self.limit > 0:
+            last = min(last, self.limit)
+        while self.next_fetch <= last:
+            thread = threading.Thread(target=self._fetch, args=(self.next_fetch,))
+            thread.setDaemon(True)
+            thread.start()
+            self.next_fetch += 1
+
+    def next(self):
+        if self.last_page is not None and self.current_page >= self.last_page:
+            raise StopIteration
+        if self.limit > 0 and self.current_page >= self.limit:
+            raise StopIteration
+        self.current_page += 1
+        page = self.current_page
+        self._fill_window()
+
+        self.condition.acquire()
+        try:
+            while page not in self.results:
+                self.condition.wait()
+            kind, items = self.results.pop(page)
+        finally:
+            self.condition.release()
+
+        if kind == 'error':
+            self._end(page - 1)
+            raise items[0], items[1], items[2]
+        if len(items) == 0:
+            self._end(page - 1)
+            raise StopIteration
+        if self.page_size is not None and len(items) < self.page_size:
+            self._end(page)
+        return items
+
+class CheckpointIterator(BaseIterator):
+    """
+    Wraps a page iterator and saves its position to a checkpoint
+    store every few pages, along with the offset in the current page
+    of the items consumed by an ItemIterator.
+    The position is saved before fetching a page, once the previous
+    one is fully consumed, and when the iteration ends.
+    """
+
+    def __init__(self, iterator, store, token, every=1):
+        self.iterator = iterator
+        self.store = store
+        self.token = token
+        self.every = every
+        self.item_iterator = None
+        self.pages = 0
+        self.unsaved = 0
+        self.skip = 0
+        self.resumed = None
+
+    def _get_limit(self):
+        return self.iterator.limit
+
+    def _set_limit(self, limit):
+        self.iterator.limit = limit
+
+    limit = property(_get_limit, _set_limit)
+
+    def next(self):
+        if self.every and self.unsaved >= self.every:
+            self.checkpoint()
+        try:
+            page = self.iterator.next()
+        except StopIteration:
+            if self.resumed is None:
+                self.checkpoint()
+            raise
+        self.resumed = None
+        self.pages += 1
+        self.unsaved += 1
+        return page
+
+    def prev(self):
+        return self.iterator.prev()
+
+    def checkpoint(self):
+        """Save the current position and return its token"""
+        if self.resumed is not None:
+            # nothing consumed since resuming
+            state = self.resumed
+        else:
+            offset = 0
+            items = self.item_iterator
+            if items is not None and items.current_page is not None and \
+                    items.page_index + 1 < len(items.current_page):
+                offset = items.page_index + 1
+            state = {'position': self.iterator.get_state(),
+                     'pages': self.pages, 'offset': offset}
+        self.store.save(self.token, state)
+        self.unsaved = 0
+        return self.token
+
+    def resume(self, token=None):
+        if token is not None:
+            self.token = token
+        state = self.store.load(self.token)
+        if state is None:
+            return
+        rewind = state['offset'] > 0
+        self.iterator.set_state(state['position'], rewind)
+        self.pages = state['pages']
+        if rewind:
+            self.pages -= 1
+        self.skip = state['offset']
+        if self.item_iterator is not None:
+            self.item_iterator.skip = self.skip
+        self.resumed = state
+
 class ItemIterator(BaseIterator):
 
     def __init__(self, page_iterator):
@@ -105,17 +489,49 @@ class ItemIterator(BaseIterator):
         self.current_page = None
         self.page_index = -1
         self.count = 0
+        # items of the next page already consumed, when resuming
+        self.skip = 0
+        # ids of the last items returned, when deduplicating
+        self.window = 0
+        self.recent = None
+        self.recent_ids = None
+        self.duplicates = 0
+
+    def dedupe(self, window=1000):
+        """Skip the items whose id is among the last window ones returned"""
+        self.window = window
+        self.recent = deque()
+        self.recent_ids = set()
+
+    def _is_duplicate(self, item):
+        if isinstance(item, (int, long)):
+            key = item
+        else:
+            key = _item_id(item)
+        if key in self.recent_ids:
+            return True
+        self.recent.append(key)
+        self.recent_ids.add(key)
+        if len(self.recent) > self.window:
+            self.recent_ids.discard(self.recent.popleft())
+        return False
 
     def next(self):
         if self.limit > 0 and self.count == self.limit:
             raise StopIteration
-        if self.current_page is None or self.page_index == len(self.current_page) - 1:
-            # Reached end of current page, get the next page...
-            self.current_page = self.page_iterator.next()
-            self.page_index = -1
-        self.page_index += 1
+        while True:
+            while self.current_page is None or self.page_index >= len(self.current_page) - 1:
+                # Reached end of current page, get the next page...
+                self.current_page = self.page_iterator.next()
+                self.page_index = self.skip - 1
+                self.skip = 0
+            self.page_index += 1
+            item = self.current_page[self.page_index]
+            if self.recent is None or not self._is_duplicate(item):
+                break
+            self.duplicates += 1
         self.count += 1
-        return self.current_page[self.page_index]
+        return item
 
     def prev(self):
         if self.current_page is None:
@@ -130,3 +546,90 @@ class ItemIterator(BaseIterator):
         self.count -= 1
         return self.current_page[self.page_index]
 
+def _prefetch_pages(iterator, queue, stopped):
+    # runs in the worker thread, holds no reference to the
+    # PrefetchIterator so it can be collected when dropped.
+    while not stopped.isSet():
+        try:
+            item = ('page', (iterator.next(), iterator.get_state()))
+        except StopIteration:
+            item = ('stop', None)
+        except Exception:
+            item = ('error', sys.exc_info())
+        while not stopped.isSet():
+            try:
+                queue.put(item, timeout=0.1)
+                break
+            except Full:
+                pass
+        if item[0] != 'page':
+            return
+
+class PrefetchIterator(BaseIterator):
+    """
+    Wraps a page iterator and fetches up to size pages in
+    a background thread while the current one is consumed.
+    Errors of the fetches are raised by next in the caller.
+    """
+
+    def __init__(self, iterator, size=1):
+        self.iterator = iterator
+        self.size = size
+        self.queue = Queue(maxsize=size)
+        self.stopped = threading.Event()
+        self.thread = None
+        self.done = False
+        self.state = None
+
+    def _get_limit(self):
+        return self.iterator.limit
+
+    def _set_limit(self, limit):
+        self.iterator.limit = limit
+
+    limit = property(_get_limit, _set_limit)
+
+    def next(self):
+        if self.done:
+            raise StopIteration
+        if self.thread is None:
+            self.thread = threading.Thread(target=_prefetch_pages,
+                    args=(self.iterator, self.queue, self.stopped))
+            self.thread.setDaemon(True)
+            self.thread.start()
+        kind, value = self.queue.get()
+        if kind == 'page':
+            page, self.state = value
+            return page
+        self.done = True
+        if kind == 'stop':
+            raise StopIteration
+        raise value[0], value[1], value[2]
+
+    def prev(self):
+        raise TweepError('Can not page back while prefetching')
+
+    def get_state(self):
+        # the wrapped iterator is ahead of the pages returned
+        if self.state is None:
+            return self.iterator.get_state()
+        return self.state
+
+    def set_state(self, state, rewind=False):
+        if self.thread is not None:
+            raise TweepError('Can not move a cursor while prefetching')
+        self.iterator.set_state(state, rewind)
+
+    def close(self):
+        """Stop fetching pages in the background"""
+        self.done = True
+        self.stopped.set()
+        # unblock the worker if it waits for room in the queue
+        try:
+            while True:
+                self.queue.get_nowait()
+        except Empty:
+            pass
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,147 @@
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+"""
+Follower and friend changes between snapshots of ids.
+"""
+
+import os
+import time
+import urllib
+
+from tweepy.ids import IDSet, _id_store, _pack_ids, _unpack_ids
+from tweepy.utils import replace_file
+
+
+def diff_ids(old, new):
+    """
+    Return the (added, removed) IDSets of two snapshots of ids,
+    computed in a single merge of the sorted ids.
+    """
+    if not isinstance(old, IDSet):
+        old = IDSet(old)
+    if not isinstance(new, IDSet):
+        new = IDSet(new)
+    a, b = old.ids, new.ids
+    added, removed = _id_store(), _id_store()
+    add, remove = added.append, removed.append
+    i = j = 0
+    len_a, len_b = len(a), len(b)
+    while i < len_a and j < len_b:
+        x, y = a[i], b[j]
+        if x < y:
+            remove(x)
+            i += 1
+        elif y < x:
+            add(y)
+            j += 1
+        else:
+            i += 1
+            j += 1
+    removed.extend(a[i:])
+    added.extend(b[j:])
+    return IDSet._from_sorted(added), IDSet._from_sorted(removed)
+
+
+def hydrate_users(api, ids, batch_size=100):
+    """Yield the users of ids, looked up batch_size at a time"""
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        for user in api.lookup_users(user_ids=ids[start:start + batch_size]):
+            yield user
+
+
+class SnapshotHistory(object):
+    """
+    Keeps dated snapshots of ids (ex: the followers of an account) in
+    a directory, one file of sorted little endian int64 per snapshot.
+    """
+
+    def __init__(self, directory, keep=None):
+        """
+        directory: where the snapshots are written
+        keep: number of snapshots kept per name (None keeps them all)
+        """
+        if os.path.exists(directory) is False:
+            os.mkdir(directory)
+        self.directory = directory
+        self.keep = keep
+
+    def _get_dir(self, name):
+        return os.path.join(self.directory, urllib.quote(name, safe=''))
+
+    def _get_path(self, name, timestamp):
+        return os.path.join(self._get_dir(name), '%d.ids' % timestamp)
+
+    def timestamps(self, name):
+        """Return the timestamps of the snapshots of name, oldest first"""
+        try:
+            files = os.listdir(self._get_dir(name))
+        except OSError:
+            return []
+        return sorted([int(f[:-4]) for f in files if f.endswith('.ids')])
+
+    def save(self, name, ids, timestamp=None):
+        """Save a snapshot of ids under name and return its timestamp"""
+        if timestamp is None:
+            timestamp = int(time.time())
+        directory = self._get_dir(name)
+        if os.path.exists(directory) is False:
+            os.mkdir(directory)
+        if not isinstance(ids, IDSet):
+            ids = IDSet(ids)
+        path = self._get_path(name, timestamp)
+        f = open(path + '.tmp', 'wb')
+        try:
+            f.write(_pack_ids(ids.ids))
+        finally:
+            f.close()
+        replace_file(path + '.tmp', path)
+
+        if self.keep:
+            for old in self.timestamps(name)[:-self.keep]:
+                os.remove(self._get_path(name, old))
+        return timestamp
+
+    def load(self, name, timestamp=None):
+        """Return a snapshot as an IDSet, by default the latest one"""
+        if timestamp is None:
+            timestamps = self.timestamps(name)
+            if not timestamps:
+                return None
+            timestamp = timestamps[-1]
+        path = self._get_path(name, timestamp)
+        f = open(path, 'rb')
+        try:
+            data = _unpack_ids(f.read())
+        finally:
+            f.close()
+        return IDSet._from_sorted(data)
+
+    def diff(self, name, old=None, new=None):
+        """
+        Return the (added, removed) ids between two snapshots of name,
+        by default the two latest ones.
+        """
+        timestamps = self.timestamps(name)
+        if new is None:
+            new = timestamps[-1]
+        if old is None:
+            older = [t for t in timestamps if t < new]
+            if not older:
+                return IDSet(), IDSet()
+            old = older[-1]
+        return diff_ids(self.load(name, old), self.load(name, new))
+
+    def update(self, name, ids, timestamp=None):
+        """
+        Save a new snapshot of ids and return the (added, removed)
+        ids since the previous one, both empty for the first snapshot.
+        """
+        previous = self.load(name)
+        ids = IDSet(ids)
+        self.save(name, ids, timestamp)
+        if previous is None:
+            return IDSet(), IDSet()
+        return diff_ids(previous, ids)
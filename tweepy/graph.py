@@ -0,0 +1,458 @@
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+"""
+Crawling and storage of follower graphs.
+"""
+
+import os
+import sys
+import mmap
+import time
+import struct
+import threading
+from collections import deque
+from Queue import Queue
+
+from tweepy.cursor import Cursor
+from tweepy.error import TweepError
+from tweepy.ids import IDArray, IDSet, _id_store, _pack_ids, _unpack_ids
+from tweepy.utils import replace_file
+
+
+class RateLimiter(object):
+    """Blocks callers so that at most calls happen in any period of seconds"""
+
+    def __init__(self, calls, period):
+        self.calls = calls
+        self.period = period
+        self.times = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            self.lock.acquire()
+            try:
+                now = time.time()
+                while self.times and self.times[0] <= now - self.period:
+                    self.times.popleft()
+                if len(self.times) < self.calls:
+                    self.times.append(now)
+                    return
+                wait = self.times[0] + self.period - now
+            finally:
+                self.lock.release()
+            time.sleep(wait)
+
+
+class EdgeWriter(object):
+    """
+    Appends edges to a binary file of (source, target) pairs
+    of little endian 64 bit integers, 16 bytes per edge.
+    """
+
+    def __init__(self, path, offset=None):
+        """
+        offset: size of the file to keep, ex: when resuming
+                from a checkpoint (None keeps the whole file)
+        """
+        self.path = path
+        if offset is not None and os.path.exists(path):
+            f = open(path, 'r+b')
+            try:
+                f.truncate(offset)
+            finally:
+                f.close()
+        self.file = open(path, 'ab')
+        self.file.seek(0, 2)
+        self.offset = self.file.tell()
+
+    def write(self, source, targets, reverse=False):
+        """
+        Write the edges from source to each target,
+        or from each target to source if reverse.
+        """
+        edges = _id_store([0, 0] * len(targets))
+        if reverse:
+            edges[0::2] = _id_store(targets)
+            edges[1::2] = _id_store([source]) * len(targets)
+        else:
+            edges[0::2] = _id_store([source]) * len(targets)
+            edges[1::2] = _id_store(targets)
+        self.file.write(_pack_ids(edges))
+        self.offset += len(edges) * 8
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def read_edges(path, chunk=65536):
+    """Yield the (source, target) edges of a file written by EdgeWriter"""
+    f = open(path, 'rb')
+    try:
+        while True:
+            edges = _unpack_ids(f.read(chunk * 16))
+            for i in xrange(0, len(edges) - 1, 2):
+                yield edges[i], edges[i + 1]
+            if len(edges) < chunk * 2:
+                return
+    finally:
+        f.close()
+
+
+class _BudgetExhausted(Exception):
+    pass
+
+
+# response statuses of users which can not be crawled (protected,
+# suspended or deleted), any other error is retried by the next crawl
+SKIPPED_STATUSES = (401, 403, 404)
+
+
+class GraphCrawler(object):
+    """
+    Breadth first crawl of the followers (or friends) of seed users.
+
+    Each level pages the ids of every user of its frontier,
+    concurrently on a few worker threads within an optional rate
+    limit. The users found and not seen before form the frontier of
+    the next level. Frontiers and seen users are kept as IDSets and
+    edges are appended to an EdgeWriter file: an edge (a, b) means a
+    follows b.
+
+    The crawl stops after depth levels or when budget API calls were
+    made. With a checkpoint store, its progress is saved every few
+    users and crawl() continues from there after a crash or
+    once given a new budget.
+
+    Users which can not be crawled (see SKIPPED_STATUSES) are skipped
+    and listed in errors. Users failing for another reason, ex: a
+    timeout, stay pending and are listed in failures until the next
+    crawl fetches them.
+    """
+
+    def __init__(self, api, seeds, edge_path, depth=1, direction='followers',
+                 budget=None, workers=4, rate_limit=None, store=None,
+                 token='graph', checkpoint_every=100):
+        """
+        api: API whose friends_ids or followers_ids method is used
+        seeds: ids of the users to start from
+        edge_path: file the edges are appended to
+        depth: number of levels to crawl
+        direction: 'followers' or 'friends'
+        budget: most API calls made (None for no limit)
+        workers: number of threads fetching ids
+        rate_limit: (calls, seconds), ex: (15, 900)
+        store: tweepy.checkpoint.CheckpointStore saving the progress
+        token: name of the checkpoint in the store
+        checkpoint_every: save the progress every this many users
+        """
+        if direction not in ('followers', 'friends'):
+            raise TweepError('Unknown crawl direction: %s' % direction)
+        self.method = getattr(api, direction + '_ids')
+        self.reverse = direction == 'followers'
+        self.seeds = IDSet(seeds)
+        self.edge_path = edge_path
+        self.depth = depth
+        self.budget = budget
+        self.workers = workers
+        self.limiter = rate_limit and RateLimiter(*rate_limit)
+        self.store = store
+        self.token = token
+        self.checkpoint_every = checkpoint_every
+
+        self.level = 0
+        self.frontier = self.seeds
+        self.seen = self.seeds
+        self.done = IDArray()
+        self.found = IDArray()
+        self.calls = 0
+        self.edges = 0
+        self.errors = {}
+        self.failures = {}
+        self.edge_offset = None
+        self.lock = threading.Lock()
+
+    def _get_state(self):
+        return {'level': self.level, 'frontier': self.frontier,
+                'seen': self.seen, 'done': self.done, 'found': self.found,
+                'calls': self.calls, 'edges': self.edges,
+                'errors': self.errors, 'failures': self.failures,
+                'edge_offset': self.edge_offset}
+
+    def checkpoint(self):
+        """Save the progress of the crawl"""
+        if self.store is not None:
+            self.store.save(self.token, self._get_state())
+
+    def _resume(self):
+        state = self.store is not None and self.store.load(self.token)
+        if state:
+            for k, v in state.items():
+                setattr(self, k, v)
+
+    def _spend(self):
+        self.lock.acquire()
+        try:
+            if self.budget is not None and self.calls >= self.budget:
+                raise _BudgetExhausted
+            self.calls += 1
+        finally:
+            self.lock.release()
+        if self.limiter:
+            self.limiter.acquire()
+
+    def _fetch(self, user_id):
+        method = self.method
+
+        def call(*args, **kargs):
+            self._spend()
+            return method(*args, **kargs)
+        call.pagination_mode = 'cursor'
+        return IDArray.from_pages(Cursor(call, user_id=user_id).pages())
+
+    def _work(self, tasks, results, stopped):
+        while True:
+            user_id = tasks.get()
+            if user_id is None:
+                return
+            if stopped.isSet():
+                results.put((user_id, None, None))
+                continue
+            try:
+                results.put((user_id, self._fetch(user_id), None))
+            except _BudgetExhausted:
+                stopped.set()
+                results.put((user_id, None, None))
+            except TweepError, e:
+                results.put((user_id, None, e))
+            except Exception:
+                stopped.set()
+                results.put((user_id, None, sys.exc_info()))
+
+    def _crawl_level(self, writer):
+        """Return True once every user of the frontier is crawled"""
+        done = self.done.to_set()
+        pending = [user_id for user_id in self.frontier if user_id not in done]
+        tasks, results = Queue(), Queue()
+        stopped = threading.Event()
+        for user_id in pending:
+            tasks.put(user_id)
+        threads = []
+        for i in range(min(self.workers, len(pending))):
+            tasks.put(None)
+            thread = threading.Thread(target=self._work, args=(tasks, results, stopped))
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+
+        failure = None
+        complete = True
+        unsaved = 0
+        for i in range(len(pending)):
+            user_id, ids, error = results.get()
+            if isinstance(error, tuple):
+                failure = failure or error
+                complete = False
+                continue
+            if error is not None:
+                status = getattr(error.response, 'status', None)
+                if status not in SKIPPED_STATUSES:
+                    # ex: a timeout or rate limit, fetched again later
+                    self.failures[user_id] = str(error)
+                    complete = False
+                    continue
+                # ex: protected users, skipped
+                self.errors[user_id] = str(error)
+            elif ids is None:
+                complete = False
+                continue
+            else:
+                writer.write(user_id, ids, self.reverse)
+                self.edges += len(ids)
+                self.found.extend(ids)
+            self.failures.pop(user_id, None)
+            self.done.append(user_id)
+            unsaved += 1
+            if unsaved >= self.checkpoint_every:
+                writer.flush()
+                self.edge_offset = writer.offset
+                self.checkpoint()
+                unsaved = 0
+        for thread in threads:
+            thread.join()
+
+        writer.flush()
+        self.edge_offset = writer.offset
+        self.checkpoint()
+        if failure:
+            raise failure[0], failure[1], failure[2]
+        return complete
+
+    def crawl(self):
+        """
+        Crawl until depth is reached or the budget is spent.
+        Returns True if the crawl is complete.
+        """
+        self._resume()
+        writer = EdgeWriter(self.edge_path, self.edge_offset)
+        try:
+            while self.level < self.depth:
+                if not self._crawl_level(writer):
+                    return False
+                # next level: the users found and never seen
+                frontier = self.found.to_set() - self.seen
+                self.seen = self.seen | frontier
+                self.frontier = frontier
+                self.found = IDArray()
+                self.done = IDArray()
+                self.level += 1
+                self.checkpoint()
+            return True
+        finally:
+            writer.close()
+
+
+# snapshot file: header, the sorted neighbors of each node,
+# the node table (ids, offsets, counts) and the footer.
+SNAPSHOT_MAGIC = 'TWPYCSR1'
+_snapshot_footer = struct.Struct('<QQ8s')
+
+
+def _write_int64(f, data):
+    f.write(_pack_ids(data))
+
+
+class GraphSnapshotWriter(object):
+    """
+    Writes a graph snapshot file, node by node, in a compressed sparse
+    row layout read by GraphSnapshot. The neighbors of each node are
+    written sorted as soon as they are added, only the node table is
+    kept in memory (24 bytes per node).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path + '.tmp', 'wb')
+        self.file.write(SNAPSHOT_MAGIC)
+        self.offset = len(SNAPSHOT_MAGIC)
+        self.nodes = _id_store()
+        self.offsets = _id_store()
+        self.counts = _id_store()
+
+    def add(self, node, ids):
+        """Add a node and its neighbors"""
+        neighbors = IDSet(ids)
+        _write_int64(self.file, neighbors.ids)
+        self.nodes.append(node)
+        self.offsets.append(self.offset)
+        self.counts.append(len(neighbors))
+        self.offset += len(neighbors) * 8
+
+    def add_pages(self, node, pages):
+        """Add a node and the neighbors of some pages of ids, ex: Cursor pages"""
+        self.add(node, IDArray.from_pages(pages))
+
+    def close(self):
+        """Write the node table and move the snapshot into place"""
+        order = sorted(range(len(self.nodes)), key=self.nodes.__getitem__)
+        nodes = [self.nodes[i] for i in order]
+        for i in range(1, len(nodes)):
+            if nodes[i] == nodes[i - 1]:
+                self.file.close()
+                os.remove(self.path + '.tmp')
+                raise TweepError('Node added twice to the snapshot: %s' % nodes[i])
+        _write_int64(self.file, nodes)
+        _write_int64(self.file, [self.offsets[i] for i in order])
+        _write_int64(self.file, [self.counts[i] for i in order])
+        self.file.write(_snapshot_footer.pack(self.offset, len(nodes), SNAPSHOT_MAGIC))
+        self.file.close()
+        replace_file(self.path + '.tmp', self.path)
+
+
+class GraphSnapshot(object):
+    """
+    Memory mapped graph snapshot written by GraphSnapshotWriter.
+    Looking up a node is a binary search of the node table in the
+    file and only its neighbors are read, as a sorted IDSet.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self.map)
+        if size < len(SNAPSHOT_MAGIC) + _snapshot_footer.size or \
+                self.map[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self.close()
+            raise TweepError('Not a graph snapshot: %s' % path)
+        table, count, magic = _snapshot_footer.unpack_from(
+                self.map, size - _snapshot_footer.size)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise TweepError('Truncated graph snapshot: %s' % path)
+        self.count = count
+        self.nodes_at = table
+        self.offsets_at = table + count * 8
+        self.counts_at = table + count * 16
+
+    def _int64(self, position):
+        return struct.unpack_from('<q', self.map, position)[0]
+
+    def _find(self, node):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._int64(self.nodes_at + middle * 8) < node:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._int64(self.nodes_at + low * 8) == node:
+            return low
+        return None
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, node):
+        return self._find(node) is not None
+
+    def __iter__(self):
+        return self.nodes()
+
+    def nodes(self):
+        """Iterate over the node ids, in order"""
+        for index in xrange(self.count):
+            yield self._int64(self.nodes_at + index * 8)
+
+    def degree(self, node):
+        index = self._find(node)
+        if index is None:
+            raise KeyError(node)
+        return self._int64(self.counts_at + index * 8)
+
+    def neighbors(self, node):
+        """Return the neighbors of node as an IDSet"""
+        index = self._find(node)
+        if index is None:
+            raise KeyError(node)
+        offset = self._int64(self.offsets_at + index * 8)
+        count = self._int64(self.counts_at + index * 8)
+        return IDSet._from_sorted(_unpack_ids(self.map[offset:offset + count * 8]))
+
+    def get(self, node, default=None):
+        try:
+            return self.neighbors(node)
+        except KeyError:
+            return default
+
+    def common_neighbors(self, a, b):
+        return self.neighbors(a) & self.neighbors(b)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
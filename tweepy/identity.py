@@ -0,0 +1,124 @@
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+import threading
+
+from tweepy.models import UserMixin, PlaceMixin
+
+# fields compared to detect that a user or place changed since it was interned
+USER_FINGERPRINT = ('screen_name', 'name', 'description', 'location', 'url',
+                    'protected', 'verified', 'profile_image_url',
+                    'followers_count', 'friends_count', 'statuses_count',
+                    'favourites_count', 'listed_count')
+PLACE_FINGERPRINT = ('name', 'full_name', 'place_type', 'country_code')
+
+# fingerprint fields of each role a payload can play
+FINGERPRINTS = {'user': USER_FINGERPRINT, 'place': PLACE_FINGERPRINT}
+
+
+class IdentityMap(object):
+    """
+    Bounded map interning users (and optionally places) by id,
+    so statuses of the same author share a single User object.
+
+    When a payload carries different data for an interned object
+    (ex: a new follower count) the object is updated in place.
+    The least recently seen objects are dropped once the map holds
+    more than size entries.
+    """
+
+    def __init__(self, size=10000, places=True):
+        """
+        size: maximum number of objects kept
+        places: intern places as well as users
+        """
+        self.size = size
+        self.places = places
+        self.hits = 0
+        self.updates = 0
+        # two generations approximate a LRU: objects seen in the old
+        # generation move to the recent one, which replaces the old one
+        # once it holds half the entries.
+        self._recent = {}
+        self._old = {}
+        self.lock = threading.Lock()
+
+    def _fingerprint_fields(self, model, role):
+        if role is None:
+            if issubclass(model, UserMixin):
+                role = 'user'
+            elif issubclass(model, PlaceMixin):
+                role = 'place'
+        if role == 'place' and not self.places:
+            return None
+        return FINGERPRINTS.get(role)
+
+    def parse(self, model, api, json, role=None):
+        """
+        Return the interned object for json, parsing it only if needed
+        role: 'user' or 'place', the model factory entry model comes
+              from [default: guessed from the class of model]
+        """
+        fields = self._fingerprint_fields(model, role)
+        if fields is None or not isinstance(json, dict) or json.get('id') is None:
+            return model.parse(api, json)
+        key = (model, json['id'])
+        fingerprint = tuple([json.get(f) for f in fields])
+
+        self.lock.acquire()
+        try:
+            entry = self._recent.get(key)
+            if entry is None:
+                entry = self._old.pop(key, None)
+                if entry is not None:
+                    self._store(key, entry)
+        finally:
+            self.lock.release()
+
+        if entry is None:
+            obj = model.parse(api, json)
+            self.lock.acquire()
+            try:
+                self._store(key, [obj, fingerprint])
+            finally:
+                self.lock.release()
+            return obj
+
+        obj = entry[0]
+        if entry[1] != fingerprint:
+            # newer data, update the shared object in place
+            for k, v in json.items():
+                model._parse_field(obj, api, k, v)
+            entry[1] = fingerprint
+            self.updates += 1
+        else:
+            self.hits += 1
+        return obj
+
+    def _store(self, key, entry):
+        if len(self._recent) >= max(self.size // 2, 1):
+            self._old = self._recent
+            self._recent = {}
+        self._recent[key] = entry
+
+    def get(self, model, id):
+        """Return the interned object of this model and id, or None"""
+        self.lock.acquire()
+        try:
+            entry = self._recent.get((model, id)) or self._old.get((model, id))
+        finally:
+            self.lock.release()
+        if entry is not None:
+            return entry[0]
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self._recent.clear()
+            self._old.clear()
+        finally:
+            self.lock.release()
+
+    def __len__(self):
+        return len(self._recent) + len(self._old)
@@ -0,0 +1,252 @@
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+"""
+Compact containers of user and status ids.
+"""
+
+import sys
+import struct
+from array import array
+from bisect import bisect_left
+
+from tweepy.utils import INT64_TYPECODE
+
+
+def _id_store(ids=()):
+    """
+    Return ids in a 64 bit integer array, or in a list
+    on platforms without 64 bit arrays (ex: windows)
+    """
+    if INT64_TYPECODE is None:
+        return list(ids)
+    return array(INT64_TYPECODE, ids)
+
+
+def _pack_ids(ids):
+    """Return ids as a string of little endian 64 bit integers"""
+    if INT64_TYPECODE is None:
+        return struct.pack('<%dq' % len(ids), *ids)
+    data = array(INT64_TYPECODE, ids)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tostring()
+
+
+def _unpack_ids(data):
+    """Return the ids of a string written by _pack_ids"""
+    count = len(data) // 8
+    if INT64_TYPECODE is None:
+        return list(struct.unpack('<%dq' % count, data[:count * 8]))
+    ids = array(INT64_TYPECODE)
+    ids.fromstring(data[:count * 8])
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    return ids
+
+
+class IDArray(object):
+    """
+    Sequence of ids stored in a 64 bit integer array (8 bytes per id)
+    in the order given by Twitter. Returned by the ids endpoints.
+    The ids are kept in a list where there are no such arrays.
+    """
+
+    def __init__(self, ids=()):
+        if isinstance(ids, (IDArray, IDSet)):
+            ids = ids.ids
+        self.ids = _id_store(ids)
+
+    @classmethod
+    def from_pages(cls, pages):
+        """Concatenate pages of ids (ex: Cursor(api.followers_ids).pages())"""
+        result = cls()
+        for page in pages:
+            result.extend(page)
+        return result
+
+    def extend(self, ids):
+        if isinstance(ids, (IDArray, IDSet)):
+            ids = ids.ids
+        if isinstance(ids, array) and isinstance(self.ids, array) \
+                and ids.typecode == self.ids.typecode:
+            self.ids.extend(ids)
+        else:
+            self.ids.extend(_id_store(ids))
+
+    def append(self, id):
+        self.ids.append(id)
+
+    def to_set(self):
+        """Return the ids as a sorted IDSet"""
+        return IDSet(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            result = IDArray()
+            result.ids = self.ids[index]
+            return result
+        return self.ids[index]
+
+    def __contains__(self, id):
+        return id in self.ids
+
+    def __eq__(self, other):
+        if isinstance(other, (IDArray, IDSet)):
+            other = other.ids
+        try:
+            return self.ids == _id_store(other)
+        except (TypeError, OverflowError):
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, list(self.ids))
+
+    def __getstate__(self):
+        # pickle, in a tuple: pickle protocols 0 and 1 skip
+        # __setstate__ for an empty state, ex: no ids
+        return (1, _pack_ids(self.ids))
+
+    def __setstate__(self, state):
+        # unpickle
+        if isinstance(state, tuple):
+            state = state[1]
+        self.ids = _unpack_ids(state)
+
+
+class IDSet(IDArray):
+    """
+    Sorted set of ids stored in a 64 bit integer array. Membership
+    tests use a binary search and set operations linear merges.
+    """
+
+    def __init__(self, ids=()):
+        if isinstance(ids, IDSet):
+            self.ids = _id_store(ids.ids)
+            return
+        if isinstance(ids, IDArray):
+            ids = ids.ids
+        self.ids = _id_store(sorted(set(ids)))
+
+    @classmethod
+    def from_pages(cls, pages):
+        """Build the set of the ids of many pages, sorting them once"""
+        return cls(IDArray.from_pages(pages))
+
+    @classmethod
+    def _from_sorted(cls, ids):
+        result = cls.__new__(cls)
+        result.ids = ids
+        return result
+
+    def extend(self, ids):
+        self.ids = self.union(IDSet(ids)).ids
+
+    def append(self, id):
+        self.extend([id])
+
+    add = append
+
+    def to_set(self):
+        return self
+
+    def __contains__(self, id):
+        ids = self.ids
+        index = bisect_left(ids, id)
+        return index < len(ids) and ids[index] == id
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return IDSet._from_sorted(self.ids[index])
+        return self.ids[index]
+
+    def union(self, other):
+        if not isinstance(other, IDSet):
+            other = IDSet(other)
+        a, b = self.ids, other.ids
+        result = _id_store()
+        append = result.append
+        i = j = 0
+        len_a, len_b = len(a), len(b)
+        while i < len_a and j < len_b:
+            x, y = a[i], b[j]
+            if x < y:
+                append(x)
+                i += 1
+            elif y < x:
+                append(y)
+                j += 1
+            else:
+                append(x)
+                i += 1
+                j += 1
+        result.extend(a[i:])
+        result.extend(b[j:])
+        return IDSet._from_sorted(result)
+
+    def intersection(self, other):
+        if not isinstance(other, IDSet):
+            other = IDSet(other)
+        small, large = self, other
+        if len(small) > len(large):
+            small, large = large, small
+        result = _id_store()
+        if len(small) * 16 < len(large):
+            # binary search the few ids of the small set
+            for id in small.ids:
+                if id in large:
+                    result.append(id)
+            return IDSet._from_sorted(result)
+        a, b = small.ids, large.ids
+        append = result.append
+        i = j = 0
+        len_a, len_b = len(a), len(b)
+        while i < len_a and j < len_b:
+            x, y = a[i], b[j]
+            if x < y:
+                i += 1
+            elif y < x:
+                j += 1
+            else:
+                append(x)
+                i += 1
+                j += 1
+        return IDSet._from_sorted(result)
+
+    def difference(self, other):
+        if not isinstance(other, IDSet):
+            other = IDSet(other)
+        a, b = self.ids, other.ids
+        result = _id_store()
+        append = result.append
+        i = j = 0
+        len_a, len_b = len(a), len(b)
+        while i < len_a and j < len_b:
+            x, y = a[i], b[j]
+            if x < y:
+                append(x)
+                i += 1
+            elif y < x:
+                j += 1
+            else:
+                i += 1
+                j += 1
+        result.extend(a[i:])
+        return IDSet._from_sorted(result)
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def issubset(self, other):
+        return len(self.difference(other)) == 0
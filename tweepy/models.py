@@ -2,74 +2,288 @@
 # Copyright 2009-2010 Joshua Roesslein
 # See LICENSE for details.
 
+from datetime import datetime
+
 from tweepy.error import TweepError
 from tweepy.utils import parse_datetime, parse_html_value, parse_a_href, \
         parse_search_datetime, unescape_html
 
 
+# version of the compact encoding of models, see Model.__reduce_ex__
+MODEL_ENCODING_VERSION = 1
+
+_epoch = datetime(1970, 1, 1)
+
+# names of the fields present in an encoding, by (model class, bitmask)
+_encoded_names = {}
+
+# attributes never pickled: the API reference, and the JSON kept by
+# ModelParser(retain_json=True) which would double every cached entry
+_unpickled_attributes = ('_api', '_json', '_payload')
+
+
+def _drop_unpickled(state):
+    for name in _unpickled_attributes:
+        state.pop(name, None)
+    return state
+
+
+def _rebuild_model(cls, version, mask, values, extra):
+    """Unpickle a model from its compact encoding"""
+    if version != MODEL_ENCODING_VERSION:
+        raise TweepError('Unsupported model encoding version: %s' % version)
+    state = extra or {}
+    names = _encoded_names.get((cls, mask))
+    if names is None:
+        # payloads of a type mostly share a few shapes
+        names = [name for index, name in enumerate(cls._fields) if mask & (1 << index)]
+        if len(_encoded_names) < 1000:
+            _encoded_names[(cls, mask)] = names
+    state.update(zip(names, values))
+    created_at = state.get('created_at')
+    if isinstance(created_at, (int, long)):
+        state['created_at'] = datetime.utcfromtimestamp(created_at)
+    model = cls.__new__(cls)
+    if hasattr(cls, '__setstate__'):
+        model.__setstate__(state)
+    else:
+        model.__dict__.update(state)
+    return model
+
+
 class ResultSet(list):
     """A list like object that holds results from a Twitter API query."""
 
+    def __getstate__(self):
+        # pickle
+        return _drop_unpickled(dict(self.__dict__))
+
+    def to_columns(self, fields, use_numpy=None):
+        """
+        Return a dict of typed arrays holding the given fields
+        of every result. See tweepy.columns.ColumnBuilder.
+        """
+        from tweepy.columns import to_columns
+        return to_columns(self, fields, use_numpy)
+
+
+class LazyResultSet(object):
+    """
+    A sequence holding the JSON objects of a Twitter API query
+    which only parses each of them into a model when accessed.
+    Items are parsed again on every access, keep a reference
+    to the models you want to reuse.
+    """
+
+    def __init__(self, model, api, item_list):
+        self._model = model
+        self._api = api
+        self._items = item_list
+
+    def __getstate__(self):
+        # pickle
+        return _drop_unpickled(dict(self.__dict__))
+
+    def __setstate__(self, state):
+        # unpickle
+        self.__dict__.update(state)
+        self._api = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        parse = self._model.parse
+        for obj in self._items:
+            yield parse(self._api, obj)
+
+    def to_columns(self, fields, use_numpy=None):
+        """
+        Return a dict of typed arrays holding the given fields of
+        every result, read without parsing any model.
+        """
+        from tweepy.columns import to_columns
+        return to_columns(self, fields, use_numpy)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._model.parse(self._api, obj) for obj in self._items[index]]
+        return self._model.parse(self._api, self._items[index])
+
 
 class Model(object):
 
+    # subclasses without __slots__ still get a __dict__,
+    # this only allows compact models to do without one.
+    __slots__ = ('_api',)
+
+    # known fields of the model, pickled by position instead
+    # of by name in the compact encoding (None to pickle the state).
+    # subclasses may only append to theirs, so that entries encoded
+    # before a field was added can still be read.
+    _fields = None
+
     def __init__(self, api=None):
         self._api = api
 
+    def __reduce_ex__(self, protocol):
+        if self._fields is None:
+            return object.__reduce_ex__(self, protocol)
+        # compact encoding: a bitmask of the known fields present,
+        # their values and a dict of the other attributes.
+        # timestamps are stored as seconds since the epoch.
+        state = self.__getstate__()
+        created_at = state.get('created_at')
+        if isinstance(created_at, datetime) and created_at.tzinfo is None \
+                and not created_at.microsecond:
+            delta = created_at - _epoch
+            state['created_at'] = delta.days * 86400 + delta.seconds
+        pop = state.pop
+        mask = 0
+        bit = 1
+        values = []
+        for name in self._fields:
+            if name in state:
+                values.append(pop(name))
+                mask |= bit
+            bit <<= 1
+        return (_rebuild_model,
+                (type(self), MODEL_ENCODING_VERSION, mask, tuple(values), state or None))
+
     def __getstate__(self):
         # pickle
-        pickle = dict(self.__dict__)
-        try:
-            del pickle['_api']  # do not pickle the API reference
-        except KeyError:
-            pass
-        return pickle
+        return _drop_unpickled(dict(self.__dict__))
 
     @classmethod
     def parse(cls, api, json):
         """Parse a JSON object into a model instance."""
         raise NotImplementedError
 
+    @classmethod
+    def _list_items(cls, json_list):
+        """Return the JSON objects of a list payload."""
+        return json_list
+
     @classmethod
     def parse_list(cls, api, json_list):
         """Parse a list of JSON objects into a result set of model instances."""
         results = ResultSet()
-        for obj in json_list:
+        for obj in cls._list_items(json_list):
             if obj:
                 results.append(cls.parse(api, obj))
         return results
 
+    @classmethod
+    def parse_lazy_list(cls, api, json_list):
+        """Wrap a list of JSON objects into a result set parsing them on access."""
+        return LazyResultSet(cls, api,
+                             [obj for obj in cls._list_items(json_list) if obj])
+
 
-class Status(Model):
+class LazyModel(Model):
+    """
+    Model keeping the decoded JSON object and only
+    converting each field the first time it is accessed.
+    Subclasses provide the conversion in _parse_field.
+    """
+
+    # pickle the decoded JSON and the converted fields as they are
+    _fields = None
+
+    # attributes set from a JSON key of another name
+    _aliases = {}
+
+    @classmethod
+    def parse(cls, api, json):
+        model = cls(api)
+        model._unparsed = json
+        return model
+
+    def __getattr__(self, name):
+        # only called for attributes which are not set yet
+        if name.startswith('__'):
+            raise AttributeError(name)
+        unparsed = self.__dict__.get('_unparsed')
+        key = self._aliases.get(name, name)
+        if not unparsed or key not in unparsed:
+            raise AttributeError(name)
+        self._parse_field(self, getattr(self, '_api', None), key, unparsed[key])
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def _nested_model(api, name, default):
+    """
+    Return the model the parser of api creates for name, or default
+    when there is no parser (ex: a model unpickled without its api)
+    """
+    factory = getattr(getattr(api, 'parser', None), 'model_factory', None)
+    return getattr(factory, name, default)
+
+
+def _parse_shared(model, api, json, role):
+    """Parse a user or place through the identity map of the parser, if any"""
+    identity_map = getattr(getattr(api, 'parser', None), 'identity_map', None)
+    if identity_map is None:
+        return model.parse(api, json)
+    return identity_map.parse(model, api, json, role)
+
+
+class StatusMixin(object):
+    """
+    Fields, parsing and methods of statuses, shared
+    by Status and CompactStatus (see CompactModel).
+    """
+
+    __slots__ = ()
+
+    _fields = ('author', 'contributors', 'coordinates', 'created_at',
+                 'entities', 'favorited', 'geo', 'id', 'id_str',
+                 'in_reply_to_screen_name', 'in_reply_to_status_id',
+                 'in_reply_to_status_id_str', 'in_reply_to_user_id',
+                 'in_reply_to_user_id_str', 'place', 'possibly_sensitive',
+                 'retweet_count', 'retweeted', 'retweeted_status', 'source',
+                 'source_url', 'text', 'truncated', 'user')
+
+    # models used for the user and place of statuses parsed without an api
+    _user_model = None
+    _place_model = None
 
     @classmethod
     def parse(cls, api, json):
         status = cls(api)
         for k, v in json.items():
-            if k == 'user':
-                user_model = getattr(api.parser.model_factory, 'user')
-                user = user_model.parse(api, v)
-                setattr(status, 'author', user)
-                setattr(status, 'user', user)  # DEPRECIATED
-            elif k == 'created_at':
-                setattr(status, k, parse_datetime(v))
-            elif k == 'source':
-                if '<' in v:
-                    setattr(status, k, parse_html_value(v))
-                    setattr(status, 'source_url', parse_a_href(v))
-                else:
-                    setattr(status, k, v)
-                    setattr(status, 'source_url', None)
-            elif k == 'retweeted_status':
-                setattr(status, k, Status.parse(api, v))
-            elif k == 'place':
-                if v is not None:
-                    setattr(status, k, Place.parse(api, v))
-                else:
-                    setattr(status, k, None)
+            cls._parse_field(status, api, k, v)
+        return status
+
+    @classmethod
+    def _parse_field(cls, status, api, k, v):
+        if k == 'user':
+            user_model = _nested_model(api, 'user', cls._user_model)
+            user = _parse_shared(user_model, api, v, 'user')
+            setattr(status, 'author', user)
+            setattr(status, 'user', user)  # DEPRECIATED
+        elif k == 'created_at':
+            setattr(status, k, parse_datetime(v))
+        elif k == 'source':
+            if '<' in v:
+                setattr(status, k, parse_html_value(v))
+                setattr(status, 'source_url', parse_a_href(v))
             else:
                 setattr(status, k, v)
-        return status
+                setattr(status, 'source_url', None)
+        elif k == 'retweeted_status':
+            setattr(status, k, cls.parse(api, v))
+        elif k == 'place':
+            if v is not None:
+                place_model = _nested_model(api, 'place', cls._place_model)
+                setattr(status, k, _parse_shared(place_model, api, v, 'place'))
+            else:
+                setattr(status, k, None)
+        else:
+            setattr(status, k, v)
 
     def destroy(self):
         return self._api.destroy_status(self.id)
@@ -84,37 +298,65 @@ class Status(Model):
         return self._api.create_favorite(self.id)
 
 
-class User(Model):
+class Status(StatusMixin, Model):
+    """Status keeping its fields in a __dict__"""
+
+
+class UserMixin(object):
+    """
+    Fields, parsing and methods of users, shared
+    by User and CompactUser (see CompactModel).
+    """
+
+    __slots__ = ()
+
+    _fields = ('contributors_enabled', 'created_at', 'default_profile',
+                 'default_profile_image', 'description', 'entities',
+                 'favourites_count', 'follow_request_sent', 'followers_count',
+                 'following', 'friends_count', 'geo_enabled', 'id', 'id_str',
+                 'is_translator', 'lang', 'listed_count', 'location', 'name',
+                 'notifications', 'profile_background_color',
+                 'profile_background_image_url',
+                 'profile_background_image_url_https',
+                 'profile_background_tile', 'profile_banner_url',
+                 'profile_image_url', 'profile_image_url_https',
+                 'profile_link_color', 'profile_sidebar_border_color',
+                 'profile_sidebar_fill_color', 'profile_text_color',
+                 'profile_use_background_image', 'protected', 'screen_name',
+                 'show_all_inline_media', 'status', 'statuses_count',
+                 'time_zone', 'url', 'utc_offset', 'verified')
+
+    # model used for the status embedded in users
+    _status_model = None
 
     @classmethod
     def parse(cls, api, json):
         user = cls(api)
         for k, v in json.items():
-            if k == 'created_at':
-                setattr(user, k, parse_datetime(v))
-            elif k == 'status':
-                setattr(user, k, Status.parse(api, v))
-            elif k == 'following':
-                # twitter sets this to null if it is false
-                if v is True:
-                    setattr(user, k, True)
-                else:
-                    setattr(user, k, False)
-            else:
-                setattr(user, k, v)
+            cls._parse_field(user, api, k, v)
         return user
 
     @classmethod
-    def parse_list(cls, api, json_list):
-        if isinstance(json_list, list):
-            item_list = json_list
+    def _parse_field(cls, user, api, k, v):
+        if k == 'created_at':
+            setattr(user, k, parse_datetime(v))
+        elif k == 'status':
+            setattr(user, k, cls._status_model.parse(api, v))
+        elif k == 'following':
+            # twitter sets this to null if it is false
+            if v is True:
+                setattr(user, k, True)
+            else:
+                setattr(user, k, False)
         else:
-            item_list = json_list['users']
+            setattr(user, k, v)
 
-        results = ResultSet()
-        for obj in item_list:
-            results.append(cls.parse(api, obj))
-        return results
+    @classmethod
+    def _list_items(cls, json_list):
+        if isinstance(json_list, list):
+            return json_list
+        else:
+            return json_list['users']
 
     def timeline(self, **kargs):
         return self._api.user_timeline(user_id=self.id, **kargs)
@@ -146,8 +388,20 @@ class User(Model):
         return self._api.followers_ids(user_id=self.id, *args, **kargs)
 
 
+class User(UserMixin, Model):
+    """User keeping its fields in a __dict__"""
+
+    _status_model = Status
+
+Status._user_model = User
+
+
 class DirectMessage(Model):
 
+    _fields = ('created_at', 'id', 'id_str', 'recipient', 'recipient_id',
+               'recipient_id_str', 'recipient_screen_name', 'sender',
+               'sender_id', 'sender_id_str', 'sender_screen_name', 'text')
+
     @classmethod
     def parse(cls, api, json):
         dm = cls(api)
@@ -224,8 +478,11 @@ class SearchResult(Model):
         return result
 
     @classmethod
-    def parse_list(cls, api, json_list, result_set=None):
-        results = ResultSet()
+    def _list_items(cls, json_list):
+        return json_list['results']
+
+    @classmethod
+    def _set_search_metadata(cls, results, json_list):
         results.max_id = json_list.get('max_id')
         results.since_id = json_list.get('since_id')
         results.refresh_url = json_list.get('refresh_url')
@@ -234,14 +491,25 @@ class SearchResult(Model):
         results.page = json_list.get('page')
         results.completed_in = json_list.get('completed_in')
         results.query = json_list.get('query')
-
-        for obj in json_list['results']:
-            results.append(cls.parse(api, obj))
         return results
 
+    @classmethod
+    def parse_list(cls, api, json_list, result_set=None):
+        results = super(SearchResult, cls).parse_list(api, json_list)
+        return cls._set_search_metadata(results, json_list)
+
+    @classmethod
+    def parse_lazy_list(cls, api, json_list):
+        results = super(SearchResult, cls).parse_lazy_list(api, json_list)
+        return cls._set_search_metadata(results, json_list)
+
 
 class List(Model):
 
+    _fields = ('created_at', 'description', 'following', 'full_name', 'id',
+               'id_str', 'member_count', 'mode', 'name', 'slug',
+               'subscriber_count', 'uri', 'user')
+
     @classmethod
     def parse(cls, api, json):
         lst = List(api)
@@ -255,11 +523,8 @@ class List(Model):
         return lst
 
     @classmethod
-    def parse_list(cls, api, json_list, result_set=None):
-        results = ResultSet()
-        for obj in json_list['lists']:
-            results.append(cls.parse(api, obj))
-        return results
+    def _list_items(cls, json_list):
+        return json_list['lists']
 
     def update(self, **kargs):
         return self._api.update_list(self.slug, **kargs)
@@ -330,10 +595,12 @@ class IDModel(Model):
 
     @classmethod
     def parse(cls, api, json):
+        # avoid the circular import with ids
+        from tweepy.ids import IDArray
         if isinstance(json, list):
-            return json
+            return IDArray(json)
         else:
-            return json['ids']
+            return IDArray(json['ids'])
 
 
 class BoundingBox(Model):
@@ -367,38 +634,160 @@ class BoundingBox(Model):
         return tuple(self.coordinates[0][2])
 
 
-class Place(Model):
+class PlaceMixin(object):
+    """Fields and parsing of places, shared by Place and CompactPlace"""
+
+    __slots__ = ()
+
+    _fields = ('attributes', 'bounding_box', 'contained_within', 'country',
+                 'country_code', 'full_name', 'id', 'name', 'place_type', 'url')
 
     @classmethod
     def parse(cls, api, json):
         place = cls(api)
         for k, v in json.items():
-            if k == 'bounding_box':
-                # bounding_box value may be null (None.)
-                # Example: "United States" (id=96683cc9126741d1)
-                if v is not None:
-                    t = BoundingBox.parse(api, v)
-                else:
-                    t = v
-                setattr(place, k, t)
-            elif k == 'contained_within':
-                # contained_within is a list of Places.
-                setattr(place, k, Place.parse_list(api, v))
-            else:
-                setattr(place, k, v)
+            cls._parse_field(place, api, k, v)
         return place
 
     @classmethod
-    def parse_list(cls, api, json_list):
+    def _parse_field(cls, place, api, k, v):
+        if k == 'bounding_box':
+            # bounding_box value may be null (None.)
+            # Example: "United States" (id=96683cc9126741d1)
+            if v is not None:
+                t = BoundingBox.parse(api, v)
+            else:
+                t = v
+            setattr(place, k, t)
+        elif k == 'contained_within':
+            # contained_within is a list of Places.
+            setattr(place, k, cls.parse_list(api, v))
+        else:
+            setattr(place, k, v)
+
+    @classmethod
+    def _list_items(cls, json_list):
         if isinstance(json_list, list):
-            item_list = json_list
+            return json_list
         else:
-            item_list = json_list['result']['places']
+            return json_list['result']['places']
+
+
+class Place(PlaceMixin, Model):
+    """Place keeping its fields in a __dict__"""
+
+Status._place_model = Place
+
+
+class LazyStatus(LazyModel, Status):
+    """Status converting its fields on first access"""
+
+    _aliases = {'author': 'user', 'source_url': 'source'}
+
+
+class LazyUser(LazyModel, User):
+    """User converting its fields on first access"""
+
+    _status_model = LazyStatus
+
+LazyStatus._user_model = LazyUser
+
+
+class CompactModel(Model):
+    """
+    Model storing its known fields in __slots__ instead of a per
+    instance __dict__. Fields without a slot go to an overflow dict
+    which is only created when needed.
+    Subclasses list their fields in __slots__ and get their parsing
+    and methods from a mixin, ex: StatusMixin.
+    """
+
+    __slots__ = ('_extra',)
+
+    @classmethod
+    def parse(cls, api, json):
+        model = cls(api)
+        for k, v in json.items():
+            cls._parse_field(model, api, k, v)
+        return model
+
+    def __getattr__(self, name):
+        # only called for fields without a slot or with an unset one
+        if name == '_extra':
+            raise AttributeError(name)
+        try:
+            return self._extra[name]
+        except (AttributeError, KeyError):
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            try:
+                extra = self._extra
+            except AttributeError:
+                extra = self._extra = {}
+            extra[name] = value
+
+    def __delattr__(self, name):
+        try:
+            object.__delattr__(self, name)
+        except AttributeError:
+            try:
+                del self._extra[name]
+            except (AttributeError, KeyError):
+                raise AttributeError(name)
+
+    def _slot_names(self):
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name not in ('_api', '_extra'):
+                    yield name
+
+    def __getstate__(self):
+        # pickle
+        state = {}
+        for name in self._slot_names():
+            try:
+                state[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        try:
+            state.update(self._extra)
+        except AttributeError:
+            pass
+        return _drop_unpickled(state)
+
+    def __setstate__(self, state):
+        # unpickle
+        for k, v in state.items():
+            setattr(self, k, v)
+
+
+class CompactPlace(PlaceMixin, CompactModel):
+    """Place without a per instance __dict__"""
+
+    __slots__ = PlaceMixin._fields
+
+
+class CompactStatus(StatusMixin, CompactModel):
+    """Status without a per instance __dict__"""
+
+    __slots__ = StatusMixin._fields
+
+    _place_model = CompactPlace
+
+
+class CompactUser(UserMixin, CompactModel):
+    """User without a per instance __dict__"""
+
+    __slots__ = UserMixin._fields
+
+    _status_model = CompactStatus
+
+CompactStatus._user_model = CompactUser
 
-        results = ResultSet()
-        for obj in item_list:
-            results.append(cls.parse(api, obj))
-        return results
 
 class ModelFactory(object):
     """
@@ -423,3 +812,23 @@ class ModelFactory(object):
     place = Place
     bounding_box = BoundingBox
 
+
+class LazyModelFactory(ModelFactory):
+    """
+    Factory creating statuses and users which keep
+    the decoded JSON and convert fields on demand.
+    """
+
+    status = LazyStatus
+    user = LazyUser
+
+
+class CompactModelFactory(ModelFactory):
+    """
+    Factory creating statuses, users and places which
+    store their fields in __slots__ to save memory.
+    """
+
+    status = CompactStatus
+    user = CompactUser
+    place = CompactPlace
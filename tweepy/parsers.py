@@ -2,8 +2,9 @@
 # Copyright 2009-2010 Joshua Roesslein
 # See LICENSE for details.
 
-from tweepy.models import ModelFactory
-from tweepy.utils import import_simplejson
+from tweepy.models import ModelFactory, LazyModelFactory, Model, ResultSet, \
+        LazyResultSet
+from tweepy.utils import get_json_backend
 from tweepy.error import TweepError
 
 
@@ -42,8 +43,12 @@ class JSONParser(Parser):
 
     payload_format = 'json'
 
-    def __init__(self):
-        self.json_lib = import_simplejson()
+    def __init__(self, json_backend=None):
+        """
+        json_backend: name of the JSON library to decode with,
+                      by default the fastest installed one
+        """
+        self.json_lib = get_json_backend(json_backend)
 
     def parse(self, method, payload):
         try:
@@ -66,11 +71,81 @@ class JSONParser(Parser):
             return error['errors']
 
 
+class FieldProjection(object):
+    """
+    Keeps only some fields of decoded JSON objects before they are parsed,
+    so models only hold (and only convert) the projected attributes.
+
+    fields maps a payload type (ex: 'status', 'user', 'place') to the
+    JSON keys to keep. Types without an entry keep all their keys.
+    Nested objects are projected with the fields of their own type.
+    """
+
+    # type of the objects nested under these keys
+    nested = {
+        'user': 'user', 'sender': 'user', 'recipient': 'user',
+        'status': 'status', 'retweeted_status': 'status',
+        'place': 'place',
+    }
+
+    def __init__(self, fields):
+        self.fields = dict([(k, tuple(v)) for k, v in fields.items()])
+
+    def project(self, kind, json):
+        if isinstance(json, list):
+            return [self.project(kind, item) for item in json]
+        if not isinstance(json, dict):
+            return json
+        keep = self.fields.get(kind)
+        if keep is None:
+            items = json.iteritems()
+        else:
+            items = [(k, json[k]) for k in keep if k in json]
+        projected = {}
+        for k, v in items:
+            nested = self.nested.get(k)
+            if nested and v is not None and (keep is not None or nested in self.fields):
+                v = self.project(nested, v)
+            projected[k] = v
+        return projected
+
+    def project_list(self, kind, items):
+        """Project a list of objects in place"""
+        for i, item in enumerate(items):
+            items[i] = self.project(kind, item)
+
+
 class ModelParser(JSONParser):
 
-    def __init__(self, model_factory=None):
-        JSONParser.__init__(self)
+    def __init__(self, model_factory=None, lazy=False, json_backend=None,
+            lazy_results=False, identity_map=None, fields=None,
+            retain_json=False):
+        """
+        model_factory: factory providing the model of each payload type
+        lazy: when no factory is given, use statuses and users
+              which only convert their fields on first access
+        json_backend: name of the JSON library to decode with
+        lazy_results: return list payloads as a LazyResultSet which
+                      parses each item when it is accessed
+        identity_map: tweepy.identity.IdentityMap sharing a single
+                      object among the statuses of each user and place
+        fields: dict of payload type (ex: 'status') to the JSON keys
+                models of this type keep, see FieldProjection.
+                API methods also take a fields argument for one call.
+        retain_json: keep the decoded JSON object of each result in its
+                     _json attribute and the response body in the
+                     _payload attribute of the result, so they can be
+                     forwarded without encoding them again. Neither
+                     is pickled, so cached results do not keep them.
+        """
+        JSONParser.__init__(self, json_backend)
+        if model_factory is None and lazy:
+            model_factory = LazyModelFactory
         self.model_factory = model_factory or ModelFactory
+        self.lazy_results = lazy_results
+        self.identity_map = identity_map
+        self.projection = fields and FieldProjection(fields)
+        self.retain_json = retain_json
 
     def parse(self, method, payload):
         try:
@@ -85,13 +160,45 @@ class ModelParser(JSONParser):
         else:
             cursors = None
 
-        if method.payload_list:
+        projection = self._projection(method)
+        if projection:
+            if method.payload_list:
+                projection.project_list(method.payload_type, model._list_items(json))
+            else:
+                json = projection.project(method.payload_type, json)
+
+        if method.payload_list and self.lazy_results:
+            result = model.parse_lazy_list(method.api, json)
+        elif method.payload_list:
             result = model.parse_list(method.api, json)
         else:
             result = model.parse(method.api, json)
 
+        if self.retain_json:
+            self._retain(method, model, result, json, payload)
+
         if cursors:
             return result, cursors
         else:
             return result
 
+    def _retain(self, method, model, result, json, payload):
+        if method.payload_list and isinstance(result, ResultSet):
+            items = [obj for obj in model._list_items(json) if obj]
+            for obj, item_json in zip(result, items):
+                if isinstance(obj, Model):
+                    obj._json = item_json
+        elif isinstance(result, Model):
+            result._json = json
+        if isinstance(result, (Model, ResultSet, LazyResultSet)):
+            result._payload = payload
+
+    def _projection(self, method):
+        fields = getattr(method, 'fields', None)
+        if not fields:
+            return self.projection
+        if not isinstance(fields, dict):
+            # a list of fields of the payload type
+            fields = {method.payload_type: fields}
+        return FieldProjection(fields)
+
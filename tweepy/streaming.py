@@ -11,16 +11,21 @@ from tweepy.models import Status
 from tweepy.api import API
 from tweepy.error import TweepError
 
-from tweepy.utils import import_simplejson, urlencode_noplus
-json = import_simplejson()
+from tweepy.utils import get_json_backend, urlencode_noplus
+json = get_json_backend()
 
 STREAM_VERSION = '1.1'
 
 
 class StreamListener(object):
 
-    def __init__(self, api=None):
+    # JSON library used to decode the stream, None for the fastest one
+    json_lib = None
+
+    def __init__(self, api=None, json_backend=None):
         self.api = api or API()
+        if json_backend is not None:
+            self.json_lib = get_json_backend(json_backend)
 
     def on_data(self, data):
         """Called when raw data is received from connection.
@@ -28,17 +33,22 @@ class StreamListener(object):
         Override this method if you wish to manually handle
         the stream data. Return False to stop stream and close connection.
         """
+        json_lib = self.json_lib or json
 
         if 'in_reply_to_status_id' in data:
-            status = Status.parse(self.api, json.loads(data))
+            status_json = json_lib.loads(data)
+            status = Status.parse(self.api, status_json)
+            if getattr(self.api.parser, 'retain_json', False):
+                status._json = status_json
+                status._payload = data
             if self.on_status(status) is False:
                 return False
         elif 'delete' in data:
-            delete = json.loads(data)['delete']['status']
+            delete = json_lib.loads(data)['delete']['status']
             if self.on_delete(delete['id'], delete['user_id']) is False:
                 return False
         elif 'limit' in data:
-            if self.on_limit(json.loads(data)['limit']['track']) is False:
+            if self.on_limit(json_lib.loads(data)['limit']['track']) is False:
                 return False
 
     def on_status(self, status):
@@ -80,6 +90,9 @@ class Stream(object):
         else:
             self.scheme = "http"
 
+        if options.get("json_backend"):
+            self.listener.json_lib = get_json_backend(options["json_backend"])
+
         self.api = API()
         self.headers = options.get("headers") or {}
         self.parameters = None
@@ -0,0 +1,99 @@
+# Tweepy
+# Copyright 2009-2010 Joshua Roesslein
+# See LICENSE for details.
+
+from tweepy.cursor import Cursor, checkpoint_token, _item_id
+from tweepy.models import ResultSet
+from tweepy.error import TweepError
+
+
+class TimelineSync(object):
+    """
+    Fetches only the items of a timeline newer than the previous sync.
+
+    The id of the newest item seen, its high-water mark, is kept per
+    method and parameters in a checkpoint store (see tweepy.checkpoint).
+    Each sync walks the timeline back from its newest items until the
+    mark is reached. Items are requested down to mark - 1, so seeing
+    the item of the mark itself, or an empty page below the newer
+    items when it was deleted, tells that nothing was missed. If the
+    page budget runs out before that, some items could not be fetched
+    and the result reports a gap.
+    """
+
+    def __init__(self, store, max_pages=10, initial_pages=1, autosave=True):
+        """
+        store: tweepy.checkpoint.CheckpointStore keeping the marks
+        max_pages: most pages fetched by one sync
+        initial_pages: pages fetched when no mark is known yet
+        autosave: save the new mark when sync returns,
+                  else call save once the items are processed
+        """
+        self.store = store
+        self.max_pages = max_pages
+        self.initial_pages = initial_pages
+        self.autosave = autosave
+
+    def _token(self, method, args, kargs):
+        return 'sync:' + checkpoint_token(method, args, kargs)
+
+    def mark(self, method, *args, **kargs):
+        """Return the high-water mark of a timeline, or None"""
+        state = self.store.load(self._token(method, args, kargs))
+        if state:
+            return state['since_id']
+
+    def reset(self, method, *args, **kargs):
+        """Forget the high-water mark of a timeline"""
+        self.store.delete(self._token(method, args, kargs))
+
+    def sync(self, method, *args, **kargs):
+        """
+        Return a ResultSet of the new items of the timeline, newest
+        first, with these attributes:
+            since_id: the previous mark (None on the first sync)
+            max_id: the new mark
+            gap: True when older new items could not be fetched
+        """
+        if getattr(method, 'pagination_mode', None) != 'id':
+            raise TweepError('Only methods paging by id can be synced')
+        token = self._token(method, args, kargs)
+        state = self.store.load(token)
+        since_id = state and state['since_id']
+
+        if since_id is None:
+            cursor = Cursor(method, *args, **kargs)
+            max_pages = self.initial_pages
+        else:
+            cursor = Cursor(method, since_id=since_id - 1, *args, **kargs)
+            max_pages = self.max_pages
+
+        results = ResultSet()
+        reached = since_id is None
+        for page in cursor.pages(max_pages):
+            for item in page:
+                item_id = _item_id(item)
+                if since_id is not None and item_id <= since_id:
+                    reached = True
+                else:
+                    results.append(item)
+        # the iterator also stops on an empty page, which below
+        # since_id means the mark item was deleted: nothing is missing
+        if cursor.iterator.done:
+            reached = True
+
+        results.token = token
+        results.since_id = since_id
+        results.gap = not reached
+        if results:
+            results.max_id = max([_item_id(item) for item in results])
+        else:
+            results.max_id = since_id
+        if self.autosave:
+            self.save(results)
+        return results
+
+    def save(self, results):
+        """Save the mark of the results returned by sync"""
+        if results.max_id is not None:
+            self.store.save(results.token, {'since_id': results.max_id})
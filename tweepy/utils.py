@@ -3,25 +3,59 @@
 # See LICENSE for details.
 
 from datetime import datetime
-import time
+from array import array
 import htmlentitydefs
+import os
 import re
-import locale
 from urllib import quote
 
 
-def parse_datetime(string):
-    # Set locale for date parsing
-    locale.setlocale(locale.LC_TIME, 'C')
+# Twitter always formats timestamps the same way, with english
+# names and in UTC. They are parsed by slicing at fixed positions
+# instead of with strptime: no locale switching (which is process
+# global and not thread-safe) and much faster.
+_months = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+           'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+# lookups are cheaper than int()
+_numbers = dict([('%02d' % i, i) for i in range(100)])
+_years = dict([(str(i), i) for i in range(1970, 2100)])
+
+# Parsed timestamps, many statuses and users share the same ones.
+# Only single dict operations are used on it, which are atomic.
+_datetime_cache = {}
+_datetime_cache_size = 10000
 
-    # We must parse datetime this way to work in python 2.4
-    date = datetime(*(time.strptime(string, '%a %b %d %H:%M:%S +0000 %Y')[0:6]))
 
-    # Reset locale back to the default setting
-    locale.setlocale(locale.LC_TIME, '')
+def _remember(string, date):
+    if len(_datetime_cache) >= _datetime_cache_size:
+        _datetime_cache.clear()
+    _datetime_cache[string] = date
     return date
 
 
+def parse_datetime(string):
+    """Parse a timestamp like 'Wed Aug 27 13:08:45 +0000 2008'"""
+    date = _datetime_cache.get(string)
+    if date is not None:
+        return date
+    if len(string) != 30 or string[19:26] != ' +0000 ' or \
+            string[13] != ':' or string[16] != ':':
+        raise ValueError('Invalid timestamp: %r' % string)
+    try:
+        date = datetime(_years.get(string[26:30]) or int(string[26:30]),
+                        _months[string[4:7]], _numbers[string[8:10]],
+                        _numbers[string[11:13]], _numbers[string[14:16]],
+                        _numbers[string[17:19]])
+    except (ValueError, KeyError):
+        raise ValueError('Invalid timestamp: %r' % string)
+    return _remember(string, date)
+
+
+def parse_datetimes(strings):
+    """Parse a list of timestamps with parse_datetime"""
+    return [parse_datetime(string) for string in strings]
+
+
 def parse_html_value(html):
 
     return html[html.find('>')+1:html.rfind('<')]
@@ -35,15 +69,26 @@ def parse_a_href(atag):
 
 
 def parse_search_datetime(string):
-    # Set locale for date parsing
-    locale.setlocale(locale.LC_TIME, 'C')
+    """Parse a timestamp like 'Wed, 27 Aug 2008 13:08:45 +0000'"""
+    date = _datetime_cache.get(string)
+    if date is not None:
+        return date
+    if len(string) != 31 or string[25:] != ' +0000' or \
+            string[19] != ':' or string[22] != ':':
+        raise ValueError('Invalid timestamp: %r' % string)
+    try:
+        date = datetime(_years.get(string[12:16]) or int(string[12:16]),
+                        _months[string[8:11]], _numbers[string[5:7]],
+                        _numbers[string[17:19]], _numbers[string[20:22]],
+                        _numbers[string[23:25]])
+    except (ValueError, KeyError):
+        raise ValueError('Invalid timestamp: %r' % string)
+    return _remember(string, date)
 
-    # We must parse datetime this way to work in python 2.4
-    date = datetime(*(time.strptime(string, '%a, %d %b %Y %H:%M:%S +0000')[0:6]))
 
-    # Reset locale back to the default setting
-    locale.setlocale(locale.LC_TIME, '')
-    return date
+def parse_search_datetimes(strings):
+    """Parse a list of timestamps with parse_search_datetime"""
+    return [parse_search_datetime(string) for string in strings]
 
 
 def unescape_html(text):
@@ -93,6 +138,110 @@ def import_simplejson():
 
     return json
 
+
+class JSONBackend(object):
+    """A JSON library as used by parsers and streams"""
+
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self._loads = loads
+        self.dumps = dumps
+
+    def loads(self, data):
+        # accept any bytes like object, not only strings
+        if not isinstance(data, basestring):
+            data = str(data)
+        return self._loads(data)
+
+
+def _load_module(name, module_name, from_list=None):
+    module = __import__(module_name, fromlist=from_list or ['loads'])
+    if from_list:
+        try:
+            module = getattr(module, from_list[0])
+        except AttributeError:
+            raise ImportError('No module named %s' % from_list[0])
+    return JSONBackend(name, module.loads, module.dumps)
+
+
+# (name, loader) of the JSON libraries we know about, fastest
+# first. A loader raises ImportError if its library is missing.
+json_backends = [
+    ('ujson', lambda: _load_module('ujson', 'ujson')),
+    ('yajl', lambda: _load_module('yajl', 'yajl')),
+    ('simplejson', lambda: _load_module('simplejson', 'simplejson')),
+    ('json', lambda: _load_module('json', 'json')),  # Python 2.6+
+    # Google App Engine
+    ('django', lambda: _load_module('django', 'django.utils', ['simplejson'])),
+]
+_loaded_json_backends = {}
+
+
+def register_json_backend(name, loader, first=True):
+    """Make a JSON library available to get_json_backend
+        name: name to select the backend with
+        loader: function returning a JSONBackend, raises
+                ImportError if the library is not installed
+        first: prefer it to the known libraries when picking the fastest one
+    """
+    unregister = [b for b in json_backends if b[0] == name]
+    for backend in unregister:
+        json_backends.remove(backend)
+    _loaded_json_backends.pop(name, None)
+    if first:
+        json_backends.insert(0, (name, loader))
+    else:
+        json_backends.append((name, loader))
+
+
+def _load_json_backend(name, loader):
+    backend = _loaded_json_backends.get(name)
+    if backend is None:
+        backend = _loaded_json_backends[name] = loader()
+    return backend
+
+
+def get_json_backend(name=None):
+    """Return a JSONBackend
+        name: name of the backend to use, by default the
+              fastest installed one is picked
+    """
+    if isinstance(name, JSONBackend):
+        return name
+    for backend_name, loader in json_backends:
+        if name is not None and name != backend_name:
+            continue
+        try:
+            return _load_json_backend(backend_name, loader)
+        except ImportError:
+            if name is not None:
+                raise ImportError("Can't load the %s json library" % name)
+    if name is not None:
+        raise ImportError('Unknown json library: %s' % name)
+    raise ImportError, "Can't load a json library"
+
+def _int64_typecode():
+    # 'q' only exists from Python 3.3, 'l' is 64 bits on most 64 bit systems
+    for typecode in ('q', 'l'):
+        try:
+            if array(typecode).itemsize == 8:
+                return typecode
+        except ValueError:
+            pass
+    return None
+
+# array typecode of a signed 64 bit integer, None if the platform has none
+INT64_TYPECODE = _int64_typecode()
+
+
+def replace_file(source, destination):
+    """Rename source to destination, replacing it if it exists"""
+    # windows can not rename over an existing file
+    if os.name == 'nt' and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
+
+
 def list_to_csv(item_list):
     if item_list:
         return ','.join([str(i) for i in item_list])